@@ -1,33 +1,51 @@
-import sprites
 import pygame
-import random
 import math
 import res
-import lvl
 import display
+import timers
+
+def particle_state(particle):
+    '''Returns the state every kind of particle has as plain data, for their snapshot methods.'''
+    return {
+        "pos": tuple(particle.pos), "rect": tuple(particle.rect), "vel": particle.vel,
+        "direction": particle.direction, "alpha": particle.image.get_alpha(),
+    }
+
+def restore_particle(particle, state):
+    '''Brings a particle that was just created back to a state from particle_state.'''
+    particle.pos.update(state["pos"])
+    particle.rect = pygame.Rect(state["rect"])
+    particle.vel = state["vel"]
+    particle.direction = state["direction"]
+    particle.image.set_alpha(state["alpha"])
+
+    return particle
 
 class DeathParticle(pygame.sprite.Sprite):
     '''The particle used when the player dies.'''
     SIZE = 8
 
-    def __init__(self, pos):
-        super().__init__(sprites.g_stage, sprites.g_decor)
+    def __init__(self, world, pos):
+        super().__init__(world.g_stage, world.g_decor, world.g_redraw)
+
+        self.world = world
 
         # --- POSITIONING ---
         self.pos = pygame.math.Vector2(pos[0], pos[1])
         self.rect = pygame.Rect(self.pos.x, self.pos.y, DeathParticle.SIZE, DeathParticle.SIZE)
-        self.vel = random.randint(2, 3)
-        self.direction = math.radians(random.randint(0, 360))
+        self.vel = world.rng.randint(2, 3)
+        self.direction = math.radians(world.rng.randint(0, 360))
 
-        self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.image = res.surface(self.rect.size)
 
-        sprites.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
+        world.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
+        world.wake(self)
 
     def update(self):
         self.update_x()
 
         # Steadily fade out as we go on. Once we are fully transparent, we remove this particle.
-        self.image.fill([display.bg_inv()] * 3)
+        self.image.fill([self.world.bg_inv()] * 3)
         self.image.set_alpha(self.image.get_alpha() - 15)
 
         if self.image.get_alpha() <= 0:
@@ -41,31 +59,43 @@ class DeathParticle(pygame.sprite.Sprite):
         self.rect.x = self.pos.x
         self.rect.y = self.pos.y
 
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return particle_state(self)
+
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates a particle in the state of a snapshot, for World.restore.'''
+        return restore_particle(cls(world, state["pos"]), state)
+
 class CrumbleParticle(pygame.sprite.Sprite):
     '''The particle used when an unstable block is broken.'''
     SIZE = 4
 
-    def __init__(self, pos, color):
-        super().__init__(sprites.g_stage, sprites.g_decor)
+    def __init__(self, world, pos, color):
+        super().__init__(world.g_stage, world.g_decor, world.g_redraw)
+
+        self.world = world
 
         # --- POSITIONING ---
         self.pos = pygame.math.Vector2(pos[0], pos[1])
         self.rect = pygame.Rect(self.pos.x, self.pos.y, CrumbleParticle.SIZE, CrumbleParticle.SIZE)
-        self.vel = random.randint(1, 2)
-        self.direction = math.radians(random.randint(0, 360))
+        self.vel = world.rng.randint(1, 2)
+        self.direction = math.radians(world.rng.randint(0, 360))
 
         # --- APPEARANCE ---
-        self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.image = res.surface(self.rect.size)
         self.color = color
 
-        sprites.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
+        world.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
+        world.wake(self)
 
     def update(self):
         self.update_x()
 
         # Similar to DeathParticle, also fade out, but also make sure this does
         # not display when the background matches the particle.
-        self.image.fill([self.color, self.color, self.color, (self.color != display.bg_color) * 255])
+        self.image.fill([self.color, self.color, self.color, (self.color != self.world.bg_color) * 255])
         self.image.set_alpha(self.image.get_alpha() - 15)
 
         if self.image.get_alpha() <= 0:
@@ -79,31 +109,42 @@ class CrumbleParticle(pygame.sprite.Sprite):
         self.rect.x = self.pos.x
         self.rect.y = self.pos.y
 
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return dict(particle_state(self), color=self.color)
+
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates a particle in the state of a snapshot, for World.restore.'''
+        return restore_particle(cls(world, state["pos"], state["color"]), state)
+
 class RgbParticle(pygame.sprite.Sprite):
     '''The particle shown on the RGBExit sprite.'''
     SIZE = 4
     DISTANCE = 16
 
-    def __init__(self, pos):
-        super().__init__(sprites.g_stage, sprites.g_decor)
+    def __init__(self, world, pos):
+        super().__init__(world.g_stage, world.g_decor, world.g_redraw)
 
         # --- POSITIONING ---
         self.pos = pygame.math.Vector2(pos[0], pos[1])
         self.rect = pygame.Rect(self.pos.x, self.pos.y, RgbParticle.SIZE, RgbParticle.SIZE)
         self.vel = 24
         self.distance = 24
-        self.direction = math.radians(random.randint(0, 360))
+        self.direction = math.radians(world.rng.randint(0, 360))
 
         # --- APPEARANCE ---
-        self.image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.image = res.surface(self.rect.size)
         self.image.set_alpha(0)
 
-        self.color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+        self.color = (world.rng.randint(0, 255), world.rng.randint(0, 255), world.rng.randint(0, 255))
 
         self.update_x()
 
         self.vel = -1
 
+        world.wake(self)
+
     def update(self):
         self.update_x()
         self.update_alpha()
@@ -130,13 +171,28 @@ class RgbParticle(pygame.sprite.Sprite):
         if self.distance == 0:
             self.kill()          
 
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return dict(particle_state(self), distance=self.distance, color=self.color)
+
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates a particle in the state of a snapshot, for World.restore.'''
+        particle = restore_particle(cls(world, state["pos"]), state)
+        particle.distance = state["distance"]
+        particle.color = tuple(state["color"])
+
+        return particle
+
 class Wrapping(pygame.sprite.Sprite):
     '''A gradient used to indicate wrapping.'''
     POS_START = 0
     POS_END = 1
 
-    def __init__(self, pos):
-        super().__init__(sprites.g_fg, sprites.g_decor)
+    def __init__(self, world, pos):
+        super().__init__(world.g_fg, world.g_decor)
+
+        self.pos = pos
 
         self.image = pygame.Surface((16, display.SHEIGHT), pygame.SRCALPHA)
         self.rect = self.image.get_rect(topleft = (pos * (display.SWIDTH - 16), 0))
@@ -147,59 +203,124 @@ class Wrapping(pygame.sprite.Sprite):
         if pos == Wrapping.POS_END:
             self.image = pygame.transform.flip(self.image, True, False)
 
-class Cloud(pygame.sprite.Sprite):
-    '''A sprite for the "cloud" squares in the background.'''
-    def __init__(self, pos):
-        super().__init__(sprites.g_bg)
+        self.image = res.prepare(self.image)
 
-        # Randomly pick if we are a small cloud or not.
-        self.small = bool(random.getrandbits(1))
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return {"pos": self.pos}
 
-        # Then generate our attributes depending on our size.
-        size = 8 if self.small else 16
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates a wrapping gradient in the state of a snapshot, for World.restore.'''
+        return cls(world, state["pos"])
 
-        self.image = pygame.Surface((size, size), pygame.SRCALPHA)
-        self.rect = self.image.get_rect(topleft = pos)
+class Clouds(pygame.sprite.Sprite):
+    '''
+    A single depth of the "cloud" squares in the background. Every cloud is drawn once into a
+    strip twice the width of the screen that repeats itself halfway through, one for each
+    background color. Scrolling is then only a matter of moving the strip, wrapping it around
+    once it has moved a screen's width.
+    '''
+    # Every depth as (cloud size, speed in pixels per tick, alpha), furthest away first.
+    DEPTHS = [(8, 0.2, 100), (16, 0.4, 150)]
 
-        self.pos = pygame.math.Vector2(pos)
-        self.vel = 0.2 if self.small else 0.4
+    # How many times to look for a free spot for a cloud before giving up on it.
+    ATTEMPTS = 8
 
-        self.image.set_alpha(100 if self.small else 150)
+    def __init__(self, world, speed, alpha, clouds):
+        super().__init__(world.g_bg)
 
-        # If we ended up colliding with another cloud, just remove ourselves.
-        if len(pygame.sprite.spritecollide(self, sprites.g_bg, False)) > 1:
-            self.kill()
+        self.world = world
+
+        self.speed = speed
+        self.alpha = alpha
+        self.clouds = clouds
+        self.offset = 0
+
+        # Clouds are always the inverse of the background, so keep a strip in either color.
+        self.strips = {
+            color: Clouds.render_strip(clouds, [color] * 3 + [alpha]) for color in (display.BLACK, display.WHITE)
+        }
+
+        self.image = self.strips[world.bg_inv()]
+        self.rect = self.image.get_rect(topleft = (-display.SWIDTH, 0))
+
+        world.wake(self)
+
+    @staticmethod
+    def scatter(rng, size, count):
+        '''Returns the rects of count clouds scattered around, leaving out any that would overlap another one.'''
+        clouds = []
+
+        for i in range(count):
+            for attempt in range(Clouds.ATTEMPTS):
+                cloud = pygame.Rect(
+                    rng.randint(0, display.SWIDTH - 1), rng.randint(0, display.SHEIGHT), size, size
+                )
+
+                # Also check against the clouds one wrap away, so that none overlap across the seam.
+                others = [other.move(dx, 0) for other in clouds for dx in (-display.SWIDTH, 0, display.SWIDTH)]
+
+                if cloud.collidelist(others) < 0:
+                    clouds.append(cloud)
+                    break
+
+        return clouds
+
+    @staticmethod
+    def render_strip(clouds, rgba):
+        '''Renders clouds into a strip that wraps around every screen width.'''
+        strip = pygame.Surface((display.SWIDTH * 2, display.SHEIGHT), pygame.SRCALPHA)
+
+        for cloud in clouds:
+            for dx in (-display.SWIDTH, 0, display.SWIDTH):
+                # Fill doesn't clip rects hanging off the left edge, it pushes them back on.
+                area = cloud.move(dx, 0).clip(strip.get_rect())
+
+                if area:
+                    strip.fill(rgba, area)
+
+        return res.prepare(strip)
 
     def update(self):
         # Move in different directions depending on the background color.
-        self.vel = abs(self.vel)
+        if self.world.bg_color == display.WHITE:
+            self.offset -= self.speed
+        else:
+            self.offset += self.speed
 
-        if display.bg_color == display.WHITE:
-            self.vel = -abs(self.vel)
+        self.offset %= display.SWIDTH
 
-        self.image.fill([display.bg_inv()] * 3)
+        self.image = self.strips[self.world.bg_inv()]
+        self.rect.x = int(self.offset) - display.SWIDTH
 
-        self.pos.x += self.vel
-        self.rect.x = self.pos.x
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return {
+            "speed": self.speed, "alpha": self.alpha, "clouds": [tuple(cloud) for cloud in self.clouds],
+            "offset": self.offset,
+        }
 
-        if self.pos.x > display.SWIDTH + 16 or self.pos.x < -16:
-            # If we have exceeded the display bounds, generate a new cloud
-            # at a new random position before removing outselves.
-            if self.vel > 0:
-                new_x = -16
-            else:
-                new_x = display.SWIDTH + 16
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates clouds in the state of a snapshot, for World.restore.'''
+        clouds = cls(world, state["speed"], state["alpha"], [pygame.Rect(cloud) for cloud in state["clouds"]])
+        clouds.offset = state["offset"]
 
-            new_y = random.randint(0, display.SHEIGHT)
+        return clouds
 
-            Cloud((new_x, new_y))
-
-            self.kill()
+def sky(world, density):
+    '''Fills the background of a world with density clouds, split between every depth.'''
+    for size, speed, alpha in Clouds.DEPTHS:
+        Clouds(world, speed, alpha, Clouds.scatter(world.rng, size, density // len(Clouds.DEPTHS)))
 
 class Text(pygame.sprite.Sprite):
     '''A superclass that displays ASCII text.'''
     CHAR_SIZE = 8
 
+    # Every character looked up so far, by its position on the spritesheet.
+    GLYPHS = {}
+
     def generate_text(self, text):
         '''Generates a list of surfaces that correspond to the given text.'''
         self.text = []
@@ -227,73 +348,79 @@ class Text(pygame.sprite.Sprite):
                 except:
                     char_x = ord('?')
 
-            if char_x != ord(' '):
-                # Not a space, locate where our character should be on the spritesheet.
-                char_x -= ord('!')
-                char_y = 0
-
-                while char_x > 7:
-                    char_x -= 8
-                    char_y += 1
-
-                self.text.append(
-                    res.MonoSurface(
-                        res.image_at((
-                            64 + (char_x * Text.CHAR_SIZE),
-                            char_y * Text.CHAR_SIZE,
-                            Text.CHAR_SIZE,
-                            Text.CHAR_SIZE
-                        ))
-                    )
-                )
-            else:
-                # Space, just append an empty surface.
-                self.text.append(
-                    res.MonoSurface(
-                        pygame.Surface((Text.CHAR_SIZE, Text.CHAR_SIZE), pygame.SRCALPHA)
-                    )
-                )
+            if char_x not in Text.GLYPHS:
+                Text.GLYPHS[char_x] = self.generate_glyph(char_x)
+
+            self.text.append(Text.GLYPHS[char_x])
+
+    def generate_glyph(self, char_x):
+        '''Cuts out the surface of a single character from the spritesheet.'''
+        if char_x == ord(' '):
+            # Space, just use an empty surface.
+            return res.MonoSurface(pygame.Surface((Text.CHAR_SIZE, Text.CHAR_SIZE), pygame.SRCALPHA))
+
+        # Not a space, locate where our character should be on the spritesheet.
+        char_x -= ord('!')
+        char_y = 0
+
+        while char_x > 7:
+            char_x -= 8
+            char_y += 1
+
+        return res.mono_at((
+            64 + (char_x * Text.CHAR_SIZE),
+            char_y * Text.CHAR_SIZE,
+            Text.CHAR_SIZE,
+            Text.CHAR_SIZE
+        ))
 
 class StaticText(Text):
     '''Text at a static position. This will never disappear on it's own.'''
-    def __init__(self, text, y):
-        super().__init__(sprites.g_stage)
+    def __init__(self, world, text, y):
+        super().__init__(world.g_stage)
 
         self.image = pygame.Surface((Text.CHAR_SIZE * len(text), Text.CHAR_SIZE), pygame.SRCALPHA)
         self.rect = self.image.get_rect(topleft = ((display.SWIDTH - self.image.get_width()) // 2, y))
 
         self.generate_text(text)
 
-        for i, surf in enumerate(self.text):
-            self.image.blit(
-                surf.get("white"),
-                (i * Text.CHAR_SIZE, 0, Text.CHAR_SIZE, Text.CHAR_SIZE)
-            )
+        self.image.blits(
+            [(surf.get("white"), (i * Text.CHAR_SIZE, 0)) for i, surf in enumerate(self.text)],
+            doreturn=False
+        )
+
+        self.image = res.prepare(self.image, rle=True)
 
 class LargeText(Text):
     '''A larger variation of StaticText.'''
     CHAR_SIZE = 16
 
-    def __init__(self, text, y):
-        super().__init__(sprites.g_stage)
+    def __init__(self, world, text, y):
+        super().__init__(world.g_stage)
 
         self.image = pygame.Surface((LargeText.CHAR_SIZE * len(text), LargeText.CHAR_SIZE), pygame.SRCALPHA)
         self.rect = self.image.get_rect(topleft = ((display.SWIDTH - self.image.get_width()) // 2, y))
 
         self.generate_text(text)
 
-        for i, surf in enumerate(self.text):
-            self.image.blit(
-                pygame.transform.scale(surf.get("white"), (LargeText.CHAR_SIZE, LargeText.CHAR_SIZE)),
-                (i * LargeText.CHAR_SIZE, 0, LargeText.CHAR_SIZE, LargeText.CHAR_SIZE)
-            )
+        self.image.blits(
+            [
+                (pygame.transform.scale(surf.get("white"), (LargeText.CHAR_SIZE, LargeText.CHAR_SIZE)), (i * LargeText.CHAR_SIZE, 0))
+                for i, surf in enumerate(self.text)
+            ],
+            doreturn=False
+        )
+
+        self.image = res.prepare(self.image, rle=True)
 
 class FadingText(Text):
     '''Text that will fade in or out on command.'''
-    def __init__(self, text, pos, alpha, step):
-        super().__init__(sprites.g_fg, sprites.g_decor)
+    def __init__(self, world, text, pos, alpha, step):
+        super().__init__(world.g_fg, world.g_decor, world.g_recolor, world.g_redraw)
 
-        self.image = pygame.Surface((Text.CHAR_SIZE * len(text), Text.CHAR_SIZE), pygame.SRCALPHA)
+        self.world = world
+
+        self.image = res.surface((Text.CHAR_SIZE * len(text), Text.CHAR_SIZE))
         self.rect = self.image.get_rect(topleft = pos)
         self.image.set_alpha(alpha)
 
@@ -301,21 +428,15 @@ class FadingText(Text):
         self.fade_out = False
         self.step = step
 
+        self.label = text
         self.generate_text(text)
 
-        sprites.g_fg.change_layer(self, display.FG_LAYER_TEXT)
+        world.g_fg.change_layer(self, display.FG_LAYER_TEXT)
+        world.wake(self)
 
     def update(self):
-        self.image.fill(display.TRANSPARENT_RGB)
-
         # Properly blit our text before we continue.
-        for i, surf in enumerate(self.text):
-            if display.bg_color == display.BLACK:
-                s = surf.get("white")
-            elif display.bg_color == display.WHITE:
-                s = surf.get("black")
-
-            self.image.blit(s, (i * Text.CHAR_SIZE, 0, Text.CHAR_SIZE, Text.CHAR_SIZE))
+        self.redraw()
 
         if self.fade_in:
             # We're fading in, see if we need to increase the alpha.
@@ -328,61 +449,132 @@ class FadingText(Text):
 
             if self.image.get_alpha() == 0:
                 self.kill()
+        elif not self.fade_in or self.image.get_alpha() == 255:
+            # Nothing changes until we're told to fade or the background changes.
+            self.world.sleep(self)
+
+    def redraw(self):
+        '''Draws our text in the color that stands out against the background.'''
+        self.image.fill(display.TRANSPARENT_RGB)
+
+        if self.world.bg_color == display.BLACK:
+            color = "white"
+        elif self.world.bg_color == display.WHITE:
+            color = "black"
+
+        self.image.blits(
+            [(surf.get(color), (i * Text.CHAR_SIZE, 0)) for i, surf in enumerate(self.text)],
+            doreturn=False
+        )
+
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return {
+            "text": self.label, "pos": self.rect.topleft, "step": self.step, "alpha": self.image.get_alpha(),
+            "fade_in": self.fade_in, "fade_out": self.fade_out,
+        }
+
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates text in the state of a snapshot, for World.restore.'''
+        text = cls(world, state["text"], state["pos"], state["alpha"], state["step"])
+        text.restore_state(state)
+
+        return text
+
+    def restore_state(self, state):
+        self.fade_in = state["fade_in"]
+        self.fade_out = state["fade_out"]
+        self.image.set_alpha(state["alpha"])
+        self.redraw()
 
     def show(self):
         '''Fades in this text.'''
-        self.fade_out = False
-        self.fade_in = True
+        if not self.fade_in:
+            self.fade_out = False
+            self.fade_in = True
+            self.world.wake(self)
 
     def hide(self):
         '''Fades out this text.'''
-        self.fade_in = False
-        self.fade_out = True
+        if not self.fade_out:
+            self.fade_in = False
+            self.fade_out = True
+            self.world.wake(self)
 
 class TitleText(FadingText):
     '''A FadingText that immediately pops in and then fades out after some time.'''
-    def __init__(self, text):
-        super().__init__(text, (Text.CHAR_SIZE, Text.CHAR_SIZE), 255, 5)
-        self.grace_ticks = 60
+    GRACE_TICKS = 60
+
+    def __init__(self, world, text):
+        super().__init__(world, text, (Text.CHAR_SIZE, Text.CHAR_SIZE), 255, 5)
+        self.timer = None
 
     def update(self):
-        if self.grace_ticks > 0:
-            self.grace_ticks -= 1
-        else:
-            self.hide()
+        # The grace period starts from the first tick we're shown on.
+        if self.timer is None:
+            self.timer = self.world.schedule(TitleText.GRACE_TICKS, self.hide)
 
         super().update()
 
+    def snapshot(self):
+        return dict(super().snapshot(), timer=self.timer and self.timer.due)
+
+    @classmethod
+    def restore(cls, world, state):
+        text = cls(world, state["text"])
+        text.restore_state(state)
+
+        if state["timer"] is not None:
+            if state["timer"] > world.ticks:
+                text.timer = world.schedule(state["timer"] - world.ticks, text.hide)
+            else:
+                # Already hidden, so this is only kept around to say so.
+                text.timer = timers.Timer(state["timer"], text.hide)
+
+        return text
+
 class FlipIndicator(pygame.sprite.Sprite):
     '''An indicator of the cooldown period between flips. This will fill up as the cooldown decreases.'''
     SIZE = 16
-    INDICATOR = res.MonoSurface(res.image_at((96, 64, 8, 8)))
+    INDICATOR = res.mono_at((96, 64, 8, 8))
 
-    def __init__(self):
-        super().__init__(sprites.g_fg)
+    def __init__(self, world):
+        super().__init__(world.g_fg, world.g_redraw)
 
-        self.image = pygame.Surface((FlipIndicator.SIZE, FlipIndicator.SIZE), pygame.SRCALPHA)
+        self.world = world
+
+        self.image = res.surface((FlipIndicator.SIZE, FlipIndicator.SIZE))
         self.rect = self.image.get_rect(topleft = (display.SWIDTH - 24, 8))
 
-        sprites.g_fg.change_layer(self, display.FG_LAYER_TEXT)
+        world.g_fg.change_layer(self, display.FG_LAYER_TEXT)
+        world.wake(self)
+
+    def snapshot(self):
+        '''We're redrawn every tick, so there's nothing to save.'''
+        return {}
+
+    @classmethod
+    def restore(cls, world, state):
+        return cls(world)
 
     def update(self):
         self.image.fill(display.TRANSPARENT_RGB)
 
-        if lvl.player is not None:
+        if self.world.player is not None:
             # Figure out how much the cooldown has completewd.
-            ratio = max(lvl.player.flip_cooldown, 0) / sprites.Player.FLIP_COOLDOWN
+            ratio = max(self.world.player.flip_cooldown, 0) / self.world.player.FLIP_COOLDOWN
             coord = math.ceil(16 * (1 - ratio))
 
             # Then fill up the screen with the correct bounded rectangle to reflect that.
             self.image.fill(
-                [display.bg_inv()] * 3,
+                [self.world.bg_inv()] * 3,
                 (0, FlipIndicator.SIZE - coord, FlipIndicator.SIZE, coord)
             )
 
             # If the cooldown is over, show an icon that indicates it.
             if (coord == 16):
-                if display.bg_color == 0:
+                if self.world.bg_color == 0:
                     indicator = FlipIndicator.INDICATOR.get("black")
                 else:
                     indicator = FlipIndicator.INDICATOR.get("white")
@@ -404,19 +596,20 @@ class Button(Text):
             topleft = ((display.SWIDTH - self.image.get_width()) // 2, y)
         )
 
-        for i, surf in enumerate(self.text):
-            self.image.blit(
-                surf.get("white"),
-                (24 + (i * Text.CHAR_SIZE), 8, Text.CHAR_SIZE, Text.CHAR_SIZE)
-            )
+        self.image.blits(
+            [(surf.get("white"), (24 + (i * Text.CHAR_SIZE), 8)) for i, surf in enumerate(self.text)],
+            doreturn=False
+        )
+
+        self.image = res.prepare(self.image)
 
 class PlayButton(Button):
     '''A button that (re)start the game.'''
     TYPE = 0
     ICON = res.image_at((104, 64, 8, 8))
 
-    def __init__(self, label, y):
-        super().__init__(sprites.g_stage)
+    def __init__(self, world, label, y):
+        super().__init__(world.g_stage)
         self.generate_btn(label, PlayButton.ICON, y)
 
     def select(self):
@@ -430,18 +623,19 @@ class SoundButton(Button):
     ICON_OFF = ICON_ON.copy()
     ICON_OFF.fill(display.BLACK_RGB, (4, 0, 4, 8))
 
-    def __init__(self, y):
-        super().__init__(sprites.g_stage)
-        self.generate_btn("sound on", SoundButton.ICON_ON, y)
+    def __init__(self, world, y):
+        super().__init__(world.g_stage)
+        self.update_button(y)
 
     def select(self):
         '''Select this button.'''
         res.audio_enabled = not res.audio_enabled
-        self.update_button()
+        self.update_button(self.rect.y)
         return SoundButton.TYPE
 
-    def update_button(self):
-        # Make sure this button updates to reflect the state. 
+    def update_button(self, y):
+        # Make sure this button updates to reflect the state, which can already be off
+        # when the button is made.
         # This also requires us to regen the whole button surface and bounds.
         if res.audio_enabled:
             icon = SoundButton.ICON_ON
@@ -450,7 +644,7 @@ class SoundButton(Button):
             icon = SoundButton.ICON_OFF
             label = "sound off"
 
-        self.generate_btn(label, icon, self.rect.y)
+        self.generate_btn(label, icon, y)
 
 
 class ExitButton(Button):
@@ -458,24 +652,39 @@ class ExitButton(Button):
     TYPE = 2
     ICON = res.image_at((120, 64, 8, 8))
 
-    def __init__(self, y):
-        super().__init__(sprites.g_stage)
+    def __init__(self, world, y):
+        super().__init__(world.g_stage)
         self.generate_btn("exit", ExitButton.ICON, y)
 
     def select(self):
         '''Select this button.'''
         return ExitButton.TYPE
 
+class RecordsButton(Button):
+    '''A button to show the best times.'''
+    TYPE = 3
+
+    # There's no room left on the spritesheet for an icon of its own, so borrow the # glyph.
+    ICON = res.image_at((80, 0, 8, 8))
+
+    def __init__(self, world, y):
+        super().__init__(world.g_stage)
+        self.generate_btn("best times", RecordsButton.ICON, y)
+
+    def select(self):
+        '''Select this button.'''
+        return RecordsButton.TYPE
+
 class Selector(pygame.sprite.Sprite):
     '''A selector for a group of buttons.'''
-    def __init__(self, *buttons):
-        super().__init__(sprites.g_stage)
+    def __init__(self, world, *buttons):
+        super().__init__(world.g_stage)
         self.rect = None
         self.buttons = buttons
 
         self.set_button(0)
 
-        sprites.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
+        world.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
 
     def update(self):
         rect = self.buttons[self.button].rect
@@ -484,6 +693,7 @@ class Selector(pygame.sprite.Sprite):
             self.image = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
             self.image.fill(display.WHITE_RGB)
             self.image.fill(display.TRANSPARENT_RGB, (2, 2, rect.width - 4, rect.height - 4))
+            self.image = res.prepare(self.image, rle=True)
 
             self.rect = pygame.Rect(rect)
 
@@ -1,11 +1,14 @@
 import pygame
 import res
-import random
+import time
 
 FPS       = 60
 SWIDTH    = 512 # Screen width
 SHEIGHT   = 256 # Screen height
 
+# How long an idle menu waits for input before drawing a frame anyway, in milliseconds.
+IDLE_TIMEOUT = 1000
+
 # Hard-coded color constants.
 BLACK     = 0
 BLACK_RGB = [BLACK] * 3
@@ -17,44 +20,158 @@ TRANSPARENT_RGB = [0] * 4
 
 # Hard-coded layer constants for g_stage and g_fg.
 STAGE_LAYER_PLAYER = 1
+STAGE_LAYER_GHOST = 2
 FG_LAYER_TEXT = 1
 
 dt         = pygame.time.Clock().tick(FPS) / 1000 # Delta time
-bg_color   = WHITE # Current BG color
-shake      = 0 # Current "shake" value [used in shake_surface]
 
 shake_surf = pygame.Surface((SWIDTH, SHEIGHT), pygame.SRCALPHA)
 fade_surf = pygame.Surface((SWIDTH, SHEIGHT), pygame.SRCALPHA)
 fade_surf.fill(BLACK_RGB)
 
-def bg_inv():
-    '''Returns the inverted variant of this color.'''
-    return WHITE if bg_color == BLACK else BLACK
+# The actual window, and the part of it every frame is scaled up into. When the game isn't
+# scaled, everything is drawn straight to the window and output is None.
+window = None
+output = None
+
+# How long scaling up the last frame took, in seconds.
+scale_time = 0
+
+class Counters():
+    '''
+    Adds up what drawing frames costs: how many were drawn, how many draw calls and sprites
+    they took, and how long scaling them up took. Everything is reported as an average once
+    a second has gone by.
+    '''
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.began = time.perf_counter()
+        self.frames = 0
+        self.draw_calls = 0
+        self.sprites_drawn = 0
+        self.scale_time = 0
+
+    def count(self, draw_calls, sprites_drawn):
+        '''Counts a frame that was just presented. Returns a report once a second, None otherwise.'''
+        self.frames += 1
+        self.draw_calls += draw_calls
+        self.sprites_drawn += sprites_drawn
+        self.scale_time += scale_time
+
+        took = time.perf_counter() - self.began
+
+        if took < 1:
+            return None
 
-def bg_rgb():
-    '''Returns the current background color as an RGB value.'''
-    return [bg_color] * 3
+        report = (
+            f"{self.frames / took:.1f} frames/s, {self.draw_calls / self.frames:.1f} draw calls "
+            f"and {self.sprites_drawn / self.frames:.1f} sprites a frame, "
+            f"{self.scale_time / self.frames * 1000:.2f}ms scaling"
+        )
+
+        self.start()
+
+        return report
+
+def best_scale():
+    '''Returns the largest scale whose window still fits on the desktop with room to spare.'''
+    width, height = pygame.display.get_desktop_sizes()[0]
+
+    return max(min((width - 1) // SWIDTH, (height - 1) // SHEIGHT), 1)
+
+def create(scale=1, fullscreen=False):
+    '''
+    Initializes and configures the screen, returning the surface to draw frames on. Frames
+    are always drawn at SWIDTH x SHEIGHT, and then scaled up by an integer scale when they
+    are presented. Fullscreen picks the largest scale that fits and letterboxes the rest.
+    '''
+    global shake_surf, fade_surf, window, output
+
+    if fullscreen:
+        window = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        scale = max(min(window.get_width() // SWIDTH, window.get_height() // SHEIGHT), 1)
+    else:
+        window = pygame.display.set_mode((SWIDTH * scale, SHEIGHT * scale))
 
-def create():
-    '''Initializes and configures the screen.'''
-    screen = pygame.display.set_mode((SWIDTH, SHEIGHT))
     pygame.display.set_caption("monoman")
     pygame.display.set_icon(pygame.image.load(res.media_path("icon.png")))
+
+    if scale == 1 and not fullscreen:
+        screen = window
+        output = None
+    else:
+        # Frames are drawn on a surface of their own, then scaled straight into the middle
+        # of the window. Anything around that stays black.
+        screen = pygame.Surface((SWIDTH, SHEIGHT)).convert()
+
+        area = pygame.Rect(0, 0, SWIDTH * scale, SHEIGHT * scale)
+        area.center = window.get_rect().center
+
+        window.fill(BLACK_RGB)
+        output = window.subsurface(area)
+
+    # Now that there's a display, move everything made so far into its pixel format.
+    shake_surf = res.prepare(shake_surf)
+    fade_surf = res.prepare(fade_surf)
+    res.convert_all()
+
     return screen
 
-def shake_surface(surf):
+def present(screen):
+    '''Shows a frame drawn on screen, scaling it up to the window if needed.'''
+    global scale_time
+
+    if output is None:
+        scale_time = 0
+    else:
+        start = time.perf_counter()
+
+        # This is a nearest-neighbour scale, so pixels stay sharp.
+        pygame.transform.scale(screen, output.get_size(), output)
+
+        scale_time = time.perf_counter() - start
+
+    pygame.display.flip()
+
+def menu_events(idle):
     '''
-    Shakes a surface based on the current shake value. This involves translating
-    the surface a random value on another surface and then re-blitting the another 
-    surface on the given surface.
+    Returns every event that came in since the last frame. When idle, nothing on screen can
+    change until an event does come in, so wait for one instead of drawing frames that would
+    all look the same.
     '''
+    if not idle:
+        return pygame.event.get()
+
+    return [pygame.event.wait(IDLE_TIMEOUT)] + pygame.event.get()
+
+def ticks_for(seconds):
+    '''Returns how many ticks it takes for seconds to run out, when counting it down by dt every tick.'''
+    ticks = 0
+
+    while seconds > 0:
+        seconds -= dt
+        ticks += 1
+
+    return ticks
 
+def shake_offset(shake, rng):
+    '''Picks a random offset to shake a surface by, based on the given shake value.'''
     # Use different intensity values depending on the gravity of the event.
     # Usually entering an Exit [and especially an RGBExit] are the most powerful.
     intensity = 4 if shake > 25 else 2 if shake > 15 else 1
 
+    return rng.randint(-intensity, intensity), rng.randint(-intensity, intensity)
+
+def shake_surface(surf, offset):
+    '''
+    Shakes a surface by an offset from shake_offset. This involves translating
+    the surface on another surface and then re-blitting the another 
+    surface on the given surface.
+    '''
     shake_surf.fill(TRANSPARENT_RGB)
-    shake_surf.blit(surf, pygame.Rect(random.randint(-intensity, intensity), random.randint(-intensity, intensity), SWIDTH, SHEIGHT))
+    shake_surf.blit(surf, pygame.Rect(offset[0], offset[1], SWIDTH, SHEIGHT))
     surf.fill(TRANSPARENT_RGB)
     surf.blit(shake_surf, pygame.Rect(0, 0, SWIDTH, SHEIGHT))
 
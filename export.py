@@ -0,0 +1,150 @@
+# This script renders a recording made with python3 monoman.py --record as frames, without
+# showing anything. Frames are written as numbered PNGs, or as a raw RGB stream on stdout to
+# be piped into an encoder, like:
+#   python3 export.py run.mrep | ffmpeg -f rawvideo -pix_fmt rgb24 -s 512x256 -r 60 -i - run.mp4
+#
+# The run is split up into stretches between the keyframes the recording keeps, which are
+# drawn at the same time by a pool of processes, each starting from the keyframe at the start
+# of its stretch. Recordings from before keyframes were kept are first played through without
+# drawing anything, taking a snapshot every so often to start from instead.
+
+import os
+
+# Nothing is shown, so don't bother opening a window or an audio device.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# Frames may be going to stdout, so keep the pygame banner out of it.
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+# SDL catches SIGTERM otherwise, which is how the pool stops its processes.
+os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+
+import argparse
+import multiprocessing
+import sys
+import time
+import zlib
+import pygame
+import res
+import display
+import replay
+import world
+
+# Every process keeps its own screen around between segments.
+screen = None
+stage_surf = None
+
+def start():
+    '''Sets up a process to draw frames in.'''
+    global screen, stage_surf
+
+    pygame.init()
+
+    screen = display.create()
+    stage_surf = res.surface((display.SWIDTH, display.SHEIGHT))
+
+    res.audio_enabled = False
+
+def snapshots(recording, segment):
+    '''
+    Plays a recording without keyframes through without drawing it. Returns a snapshot from
+    the start of every segment after the first one.
+    '''
+    run = recording.play(world.World())
+    snapshots = []
+
+    for tick, inputs in enumerate(recording.inputs):
+        if tick > 0 and tick % segment == 0:
+            snapshots.append(run.snapshot())
+
+        if run.step(inputs):
+            break
+
+    return snapshots
+
+def render(task):
+    '''
+    Draws the frames from start up to end, starting from snapshot if there is one, or from
+    the keyframe before start otherwise. Returns how many frames there were, and the frames
+    as compressed RGB bytes unless they were saved to png_path.
+    '''
+    recording, start, end, snapshot, png_path = task
+
+    if snapshot is None:
+        run = recording.seek(world.World(), start)
+    else:
+        display.dt = recording.dt
+        run = replay.Run.restore(world.World(), snapshot)
+
+    frames = []
+    drawn = 0
+
+    for tick in range(start, end):
+        # The last tick of a finished run is never drawn.
+        if run.step(recording.inputs[tick]):
+            break
+
+        run.render(screen, stage_surf)
+        drawn += 1
+
+        if png_path is not None:
+            pygame.image.save(screen, os.path.join(png_path, f"{tick:06d}.png"))
+        else:
+            frames.append(pygame.image.tobytes(screen, "RGB"))
+
+    if png_path is not None:
+        return drawn, None
+
+    # Frames are mostly flat colors, so this makes them far cheaper to send back.
+    return drawn, zlib.compress(b"".join(frames), 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Renders a recording as frames.")
+    parser.add_argument("recording", help="a recording made with monoman.py --record")
+    parser.add_argument("--png", metavar="PATH", help="write numbered PNGs to PATH instead of RGB to stdout")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="how many processes to draw with")
+    parser.add_argument("--segment", type=int, help="how many frames each process draws at a time, as far apart as the keyframes by default")
+    args = parser.parse_args()
+
+    recording = replay.Recording.load(args.recording)
+
+    if args.png is not None:
+        os.makedirs(args.png, exist_ok=True)
+
+    began = time.perf_counter()
+
+    start()
+
+    if recording.keyframes:
+        # Every process seeks to its own start, which is as quick as it gets on a keyframe.
+        segment = args.segment or recording.interval
+        starts = [None] * -(-len(recording.inputs) // segment)
+    else:
+        segment = args.segment or 300
+        starts = [None] + snapshots(recording, segment)
+
+    tasks = [
+        (recording, first, min(first + segment, len(recording.inputs)), snapshot, args.png)
+        for first, snapshot in zip(range(0, len(recording.inputs), segment), starts)
+    ]
+
+    frames = 0
+
+    # Processes are started fresh rather than forked, as SDL doesn't survive being forked.
+    with multiprocessing.get_context("spawn").Pool(args.jobs, start) as pool:
+        for count, data in pool.imap(render, tasks):
+            frames += count
+
+            if data is not None:
+                sys.stdout.buffer.write(zlib.decompress(data))
+
+        pool.close()
+        pool.join()
+
+    took = time.perf_counter() - began
+
+    print(
+        f"exported {frames} frames in {took:.2f}s, {frames / display.FPS / took:.1f}x real time",
+        file=sys.stderr
+    )
@@ -0,0 +1,51 @@
+# This script reports how much memory the obstacles of every level take up, both as they
+# are now and as they would be if every obstacle still drew its own surface.
+# Run it from the project directory with python3 footprint.py
+
+import pygame
+import sys
+import sprites
+import lvl
+import world
+
+def surface_size(surface):
+    '''Returns how many bytes the pixels of a surface take up.'''
+    return surface.get_height() * surface.get_pitch()
+
+def report(idx):
+    '''Generates the level at idx and returns its footprint as a single line.'''
+    level = world.World(seed=0)
+    lvl.gen(level, idx)
+
+    # Make sure every obstacle has picked its surface.
+    level.update()
+
+    obstacles = [sprite for sprite in level.g_stage if isinstance(sprite, sprites.ObstacleSprite)]
+
+    # Before, every obstacle had a surface of its own the size of its image.
+    private = sum(surface_size(sprite.image) for sprite in obstacles)
+
+    # Now, every obstacle in the same state points at the same surface.
+    shared = {id(sprite.image): sprite.image for sprite in obstacles}.values()
+
+    # The tiles themselves, which are the only thing kept for chunks far from the camera.
+    tiles = level.tilemap
+    records = (
+        sum(len(data) for data in tiles.data) + tiles.bits.itemsize * len(tiles.bits)
+        + sum(len(flash) for flash in tiles.flash)
+    )
+
+    return (
+        f"{idx:>5} {len(obstacles):>9} {len(list(shared)):>8} {private // 1024:>10}K "
+        f"{sum(surface_size(surface) for surface in shared) // 1024:>9}K {records // 1024:>9}K"
+    )
+
+if __name__ == "__main__":
+    pygame.init()
+
+    levels = [int(arg) for arg in sys.argv[1:]] or range(lvl.MAX)
+
+    print("level obstacles surfaces    private    shared   records")
+
+    for idx in levels:
+        print(report(idx))
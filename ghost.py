@@ -0,0 +1,175 @@
+import pygame
+import sprites
+import display
+import res
+import array
+import struct
+import sys
+
+def frame_code(player):
+    '''Packs the animation frame and direction a player is drawn with into a single byte.'''
+    return (sprites.Player.ANIMS.index(player.anim) << 3) | (player.anim_index << 1) | int(player.direction)
+
+class Segment():
+    '''
+    Where the player was and what frame it showed on every tick it spent in a single level,
+    starting from the tick since the level started that it was first seen on. Every tick is
+    a single entry in a few flat arrays, so even a long run takes up very little space.
+    '''
+    # Level, first tick, tick count.
+    HEADER = struct.Struct(">BII")
+
+    def __init__(self, level, start):
+        self.level = level
+        self.start = start
+
+        self.xs = array.array("h")
+        self.ys = array.array("h")
+        self.frames = array.array("B")
+
+    def __len__(self):
+        return len(self.frames)
+
+    def append(self, x, y, frame):
+        self.xs.append(x)
+        self.ys.append(y)
+        self.frames.append(frame)
+
+    def to_bytes(self):
+        columns = [self.xs, self.ys, self.frames]
+
+        # Arrays are in the byte order of the machine, files are always big endian.
+        if sys.byteorder == "little":
+            columns = [array.array(column.typecode, column) for column in columns]
+
+            for column in columns:
+                column.byteswap()
+
+        return Segment.HEADER.pack(self.level, self.start, len(self)) + b"".join(
+            column.tobytes() for column in columns
+        )
+
+    @classmethod
+    def from_bytes(cls, view, pos):
+        '''Reads a segment from view at pos, returning it and where it ended.'''
+        level, start, count = Segment.HEADER.unpack_from(view, pos)
+        pos += Segment.HEADER.size
+
+        segment = cls(level, start)
+
+        for column in (segment.xs, segment.ys, segment.frames):
+            size = count * column.itemsize
+
+            if pos + size > len(view):
+                raise ValueError("track ends in the middle of a level")
+
+            column.frombytes(view[pos:pos + size])
+            pos += size
+
+            if sys.byteorder == "little":
+                column.byteswap()
+
+        return segment, pos
+
+class Track():
+    '''What the player of a run looked like on every tick of it, split up by level.'''
+    def __init__(self):
+        self.segments = {}
+
+    def sample(self, world):
+        '''Adds the player of world as it is after the tick that just ran.'''
+        player = world.player
+
+        if player is None:
+            return
+
+        tick = world.ticks - world.level_start
+        segment = self.segments.get(world.level)
+
+        if segment is None:
+            segment = self.segments[world.level] = Segment(world.level, tick)
+
+        segment.append(player.rect.x, player.rect.y, frame_code(player))
+
+    def to_bytes(self):
+        return struct.pack(">B", len(self.segments)) + b"".join(
+            segment.to_bytes() for level, segment in sorted(self.segments.items())
+        )
+
+    @classmethod
+    def from_bytes(cls, view):
+        '''Reads a track from the whole of view.'''
+        track = cls()
+        pos = 1
+
+        for i in range(view[0]):
+            if pos + Segment.HEADER.size > len(view):
+                raise ValueError("track ends in the middle of a level")
+
+            segment, pos = Segment.from_bytes(view, pos)
+            track.segments[segment.level] = segment
+
+        if pos != len(view):
+            raise ValueError("track runs past its last level")
+
+        return track
+
+class Ghost(pygame.sprite.Sprite):
+    '''
+    A see-through player that runs through the current level the way a recorded run did,
+    to race against. Ghosts only ever look up where they are in their track, so dozens of
+    them cost next to nothing.
+    '''
+    ALPHA = 96
+
+    # Every frame a ghost has been drawn with so far, by frame code and background color.
+    # All ghosts share the same frames, which are already made see-through.
+    FRAMES = {}
+
+    def __init__(self, world, track):
+        super().__init__(world.g_stage, world.g_cosmetic)
+
+        self.world = world
+        self.track = track
+
+        self.image = res.surface((0, 0))
+        self.rect = pygame.Rect(0, 0, 0, 0)
+
+        world.g_stage.change_layer(self, display.STAGE_LAYER_GHOST)
+
+        # Ghosts move every tick, for as long as the run goes on.
+        world.wake(self)
+
+    @staticmethod
+    def frame(code, bg_color):
+        '''Returns the see-through frame for a frame code, against a background color.'''
+        key = (code, bg_color)
+
+        if key not in Ghost.FRAMES:
+            anim = sprites.Player.ANIMS[code >> 3]
+            frame = anim[(code >> 1) & 0b11].get("white" if bg_color == display.BLACK else "black")
+
+            if code & 1:
+                frame = pygame.transform.flip(frame, True, False)
+            else:
+                frame = frame.copy()
+
+            frame.fill((255, 255, 255, Ghost.ALPHA), special_flags=pygame.BLEND_RGBA_MULT)
+            Ghost.FRAMES[key] = res.prepare(frame, rle=True)
+
+        return Ghost.FRAMES[key]
+
+    def update(self):
+        world = self.world
+        segment = self.track.segments.get(world.level)
+
+        if segment is not None:
+            idx = world.ticks - world.level_start - segment.start
+
+            if 0 <= idx < len(segment):
+                self.image = Ghost.frame(segment.frames[idx], world.bg_color)
+                self.rect.update(segment.xs[idx], segment.ys[idx], sprites.Player.WIDTH, sprites.Player.HEIGHT)
+                return
+
+        # Nothing to race against here, so hide away. Empty rects are never drawn.
+        self.rect.update(0, 0, 0, 0)
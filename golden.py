@@ -0,0 +1,169 @@
+# This script plays every level headlessly with the same scripted inputs, and checks the
+# frames it draws against the golden hashes in res/golden.txt. Any frame that doesn't match
+# is written out, along with a diff against the last golden frame if there is one.
+# Run it from the project directory with python3 golden.py, or python3 golden.py --update
+# to accept whatever is drawn now as the new golden frames.
+
+import os
+
+# Nothing is shown, so don't bother opening a window or an audio device.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import hashlib
+import random
+import pygame
+import sprites
+import display
+import decor
+import lvl
+import res
+import world
+
+GOLDEN_PATH = res.path(os.path.join("res", "golden.txt"))
+
+# How many ticks every level is played for, and the ticks whose frames are checked.
+TICKS = 300
+CHECKED = (1, 60, 150, 300)
+
+def inputs(idx):
+    '''Yields the scripted (jump, flip, direction) inputs for every tick of the level at idx.'''
+    rng = random.Random(idx)
+
+    for tick in range(TICKS):
+        roll = rng.random()
+        direction = sprites.Player.RIGHT if rng.random() < 0.6 else None
+
+        yield roll < 0.05, roll > 0.98, direction
+
+def frame_hash(screen):
+    '''Hashes the raw pixels of a frame. RGB bytes are the same whatever format the display has.'''
+    return hashlib.blake2b(pygame.image.tobytes(screen, "RGB"), digest_size=16).hexdigest()
+
+def play(screen, idx):
+    '''Plays the level at idx, returning a {tick: (hash, frame)} of every checked tick.'''
+    level = world.World(seed=idx)
+    lvl.gen(level, idx)
+
+    # Everything main sets up too, so that it is checked as well.
+    decor.sky(level, 20)
+    decor.FlipIndicator(level)
+
+    stage_surf = res.surface((display.SWIDTH, display.SHEIGHT))
+    frames = {}
+
+    for tick, (jump, flip, direction) in enumerate(inputs(idx), 1):
+        if level.player is not None:
+            if jump:
+                level.player.jump()
+
+            if flip:
+                level.player.flip()
+
+            if direction is not None:
+                level.player.move(direction)
+            else:
+                level.player.moving = False
+
+        level.update()
+        level.render(screen, stage_surf)
+
+        if tick in CHECKED:
+            frames[tick] = (frame_hash(screen), screen.copy())
+
+    return frames
+
+def load_golden():
+    '''Returns the golden hashes, keyed by (level, tick).'''
+    golden = {}
+
+    if not os.path.exists(GOLDEN_PATH):
+        return golden
+
+    with open(GOLDEN_PATH) as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                idx, tick, digest = line.split()
+                golden[(int(idx), int(tick))] = digest
+
+    return golden
+
+def save_golden(golden):
+    with open(GOLDEN_PATH, "w") as f:
+        f.write("# level tick hash, written by golden.py --update\n")
+
+        for (idx, tick), digest in sorted(golden.items()):
+            f.write(f"{idx} {tick} {digest}\n")
+
+def diff_image(expected, actual):
+    '''Returns actual dimmed down, with every pixel that differs from expected in red.'''
+    image = actual.copy()
+    image.fill((96, 96, 96), special_flags=pygame.BLEND_RGB_MULT)
+
+    expected_px = pygame.PixelArray(expected)
+    actual_px = pygame.PixelArray(actual)
+    image_px = pygame.PixelArray(image)
+
+    for x in range(actual.get_width()):
+        for y in range(actual.get_height()):
+            if expected.unmap_rgb(expected_px[x, y]) != actual.unmap_rgb(actual_px[x, y]):
+                image_px[x, y] = (255, 0, 0)
+
+    del expected_px, actual_px, image_px
+
+    return image
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the frames of every level against their golden hashes.")
+    parser.add_argument("levels", type=int, nargs="*", help="which levels to check, all of them by default")
+    parser.add_argument("--update", action="store_true", help="accept the frames drawn now as golden")
+    parser.add_argument("--out", default="golden-diff", help="where to write frames that don't match")
+    args = parser.parse_args()
+
+    pygame.init()
+
+    screen = display.create()
+
+    # Every run has to be the same, so pin down the frame time and leave out sound.
+    display.dt = 1 / display.FPS
+    res.audio_enabled = False
+
+    # Golden frames are kept out of the repository, only to make diffs from.
+    frames_path = res.cache_path("golden")
+
+    golden = load_golden()
+    mismatches = 0
+
+    for idx in args.levels or range(lvl.MAX):
+        for tick, (digest, frame) in play(screen, idx).items():
+            name = f"{idx}-{tick}.png"
+
+            if args.update:
+                golden[(idx, tick)] = digest
+
+                os.makedirs(frames_path, exist_ok=True)
+                pygame.image.save(frame, os.path.join(frames_path, name))
+                continue
+
+            if golden.get((idx, tick)) == digest:
+                continue
+
+            mismatches += 1
+            os.makedirs(args.out, exist_ok=True)
+            pygame.image.save(frame, os.path.join(args.out, name))
+
+            if os.path.exists(os.path.join(frames_path, name)):
+                expected = pygame.image.load(os.path.join(frames_path, name))
+                pygame.image.save(diff_image(expected, frame), os.path.join(args.out, f"{idx}-{tick}-diff.png"))
+
+            print(f"level {idx} tick {tick} doesn't match, see {args.out}/{name}")
+
+    if args.update:
+        save_golden(golden)
+        print(f"updated {len(golden)} golden frames")
+    elif mismatches:
+        print(f"{mismatches} frames don't match")
+        raise SystemExit(1)
+    else:
+        print("every frame matches")
@@ -0,0 +1,143 @@
+# This script merges the telemetry of any number of sessions of the game and draws where
+# players went and died as heatmaps over every level, written as level-N.png. Sessions are
+# written to the cache directory while playing, which is where it looks by default:
+#   python3 heatmap.py --out heatmaps
+#   python3 heatmap.py ~/collected/*.mtel --out heatmaps
+#
+# The darker blue a spot is, the more time was spent there, and the more red, orange or
+# purple, the more deaths there were to spikes, kill tiles or falling out of the level.
+
+import os
+
+# Nothing is shown, so don't bother opening a window or an audio device.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import glob
+import math
+import sys
+import pygame
+import res
+import display
+import lvl
+import telemetry
+import world
+
+# What the level is drawn on, which is none of the colors its tiles can be.
+BG_RGB = (72, 88, 104)
+
+# The color of every heatmap, path first and then every cause of death.
+PATH_RGB = (32, 64, 255)
+DEATH_RGB = [(255, 32, 32), (255, 160, 0), (192, 32, 255)]
+
+# How see-through the busiest cell of a heatmap is. Every other cell fades out from there.
+PATH_ALPHA = 192
+DEATH_ALPHA = 255
+
+def sessions(paths):
+    '''Returns every session file in paths, looking through any directories for them.'''
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, "*.mtel")))
+        else:
+            yield path
+
+def merge(paths):
+    '''Adds the heatmaps of every session in paths together, returning them by level.'''
+    merged = {}
+    count = 0
+
+    for path in sessions(paths):
+        try:
+            heatmaps = telemetry.load(path)
+        except (OSError, ValueError) as e:
+            print(f"skipping {path}: {e}", file=sys.stderr)
+            continue
+
+        count += 1
+
+        for level, heatmap in heatmaps.items():
+            mine = merged.get(level)
+
+            if mine is None:
+                merged[level] = heatmap
+            elif (mine.width, mine.height) != (heatmap.width, heatmap.height):
+                # The level has changed size since, so there's no telling where anything was.
+                print(f"skipping level {level} of {path}, which is a different size", file=sys.stderr)
+            else:
+                mine.merge(heatmap)
+
+    return merged, count
+
+def overlay(heatmap, counts, rgb, alpha):
+    '''
+    Returns a surface the size of the level showing counts in rgb, scaled so that a single
+    count is faint and the highest one is alpha. Counts are scaled logarithmically, as a
+    few spots tend to see far more than everywhere else.
+    '''
+    surf = pygame.Surface((heatmap.width, heatmap.height), pygame.SRCALPHA)
+    peak = math.log1p(max(counts, default=0))
+
+    if peak > 0:
+        for idx, count in enumerate(counts):
+            if count:
+                surf.set_at(
+                    (idx % heatmap.width, idx // heatmap.width),
+                    (*rgb, round(alpha * (0.25 + 0.75 * math.log1p(count) / peak)))
+                )
+
+    return pygame.transform.scale(
+        surf, (heatmap.width * telemetry.CELL_SIZE, heatmap.height * telemetry.CELL_SIZE)
+    )
+
+def draw(heatmap):
+    '''Draws the heatmap over the tiles of its level, with the tiles of every plane showing.'''
+    game = world.World()
+    lvl.load(game, heatmap.level)
+
+    tilemap = game.tilemap
+    tilemap.stream(tilemap.rect)
+
+    surf = pygame.Surface(tilemap.rect.size)
+    surf.fill(BG_RGB)
+
+    # Tiles are hidden while the background is their color, so draw them against both.
+    for bg_color in (display.BLACK, display.WHITE):
+        game.set_bg(bg_color)
+
+        for sprite in game.g_recolor:
+            sprite.update()
+
+        surf.blits([(sprite.image, sprite.rect.move(-tilemap.rect.x, -tilemap.rect.y)) for sprite in game.g_stage])
+
+    surf.blit(overlay(heatmap, heatmap.path, PATH_RGB, PATH_ALPHA), (0, 0))
+
+    for counts, rgb in zip(heatmap.deaths, DEATH_RGB):
+        surf.blit(overlay(heatmap, counts, rgb, DEATH_ALPHA), (0, 0))
+
+    return surf
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Draws heatmaps of where players went and died.")
+    parser.add_argument("sessions", nargs="*", help="session files, or directories of them, the ones in the cache directory by default")
+    parser.add_argument("--out", metavar="PATH", default="heatmaps", help="the directory to write the heatmaps to")
+    args = parser.parse_args()
+
+    pygame.init()
+    display.create()
+
+    merged, count = merge(args.sessions or [res.cache_path("telemetry")])
+    os.makedirs(args.out, exist_ok=True)
+
+    for level, heatmap in sorted(merged.items()):
+        if level >= lvl.MAX:
+            print(f"skipping level {level}, which doesn't exist anymore", file=sys.stderr)
+            continue
+
+        pygame.image.save(draw(heatmap), os.path.join(args.out, f"level-{level}.png"))
+
+        deaths = ", ".join(f"{sum(counts)} {cause}" for counts, cause in zip(heatmap.deaths, telemetry.CAUSES))
+        print(f"level {level}: {sum(heatmap.path)} samples, {deaths}")
+
+    print(f"merged {count} sessions into {args.out}")
@@ -0,0 +1,179 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+import zlib
+import decor
+import sprites
+import lvl
+import res
+import tilemap
+import world
+
+# How many seconds apart the level directories are looked through for changes.
+POLL_INTERVAL = 0.05
+
+def load_converter():
+    '''Imports res/to_lvl.py, which isn't in a package of its own.'''
+    spec = importlib.util.spec_from_file_location("to_lvl", res.path(os.path.join("res", "to_lvl.py")))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+class Watcher(threading.Thread):
+    '''
+    Looks through res/tmx and res/lvl for levels that changed, for working on levels while
+    the game is running. Every changed .tmx is converted to a .lvl again, and every .lvl that
+    changed and loads is handed to apply to be swapped into the world in place.
+
+    Files are only ever read when their modification time or size changed, and only count as
+    changed if what's in them did, so saving a file without changing it does nothing.
+    '''
+    def __init__(self):
+        super().__init__(daemon=True)
+
+        self.base = res.path("res")
+        self.to_lvl = load_converter()
+
+        # The modification time and size of every file seen so far, and a hash of what's in it.
+        self.stamps = {}
+        self.hashes = {}
+
+        # Levels that changed since apply last looked, and when we noticed they did.
+        self.lock = threading.Lock()
+        self.changed = {}
+
+        self.stopping = threading.Event()
+
+        # Whatever is there when we start is what the game is already using.
+        self.scan("tmx")
+        self.scan("lvl")
+
+    def scan(self, directory):
+        '''Returns the level of every file in a directory that changed since the last scan.'''
+        found = []
+
+        with os.scandir(os.path.join(self.base, directory)) as entries:
+            for entry in entries:
+                idx, ext = os.path.splitext(entry.name)
+
+                if ext != "." + directory or not idx.isdigit():
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                key = (stat.st_mtime_ns, stat.st_size)
+
+                if self.stamps.get(entry.path) == key:
+                    continue
+
+                try:
+                    with open(entry.path, "rb") as f:
+                        digest = zlib.crc32(f.read())
+                except OSError:
+                    continue
+
+                self.stamps[entry.path] = key
+
+                if self.hashes.get(entry.path) != digest:
+                    self.hashes[entry.path] = digest
+                    found.append(int(idx))
+
+        return found
+
+    def run(self):
+        while not self.stopping.wait(POLL_INTERVAL):
+            noticed = time.perf_counter()
+
+            for idx in self.scan("tmx"):
+                try:
+                    self.to_lvl.create_lvl(idx, self.base)
+                except Exception as e:
+                    # A level being worked on can be broken in any number of ways, so
+                    # just wait for the next time it changes.
+                    print(f"could not convert level {idx}: {e!r}", file=sys.stderr)
+
+            for idx in self.scan("lvl"):
+                # Make sure it loads before it's swapped in, where failing would lose the level.
+                try:
+                    lvl.load(world.World(), idx)
+                except (OSError, ValueError) as e:
+                    print(f"could not load level {idx}: {e}", file=sys.stderr)
+                    continue
+
+                with self.lock:
+                    self.changed[idx] = noticed
+
+    def apply(self, world):
+        '''Swaps the level world is on for its file if it changed. Only call this between ticks.'''
+        with self.lock:
+            if not self.changed:
+                return
+
+            changed = self.changed
+            self.changed = {}
+
+        # There's nothing to swap once the game is over.
+        if world.level not in changed or world.player is None:
+            return
+
+        try:
+            swap(world)
+        except (OSError, ValueError) as e:
+            # The file changed again since it was checked. The level stays as it was until
+            # the next time it changes.
+            print(f"could not reload level {world.level}: {e}", file=sys.stderr)
+            return
+
+        took = time.perf_counter() - changed[world.level]
+        print(f"reloaded level {world.level} in {took * 1000:.1f}ms", file=sys.stderr)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+def swap(world):
+    '''
+    Replaces the tiles of the level world is on with the ones in its file. Everything else
+    stays as it was, from the text on screen to when the level started, and the player stays
+    where it is as long as it fits in the new level without being stuck in or killed by anything.
+    '''
+    player = world.player
+    tiles = [sprite for sprite in world.g_entity if sprite is not player]
+
+    # Loading comes first, so that a file that went bad since it was checked changes nothing.
+    title, (tile, x, y, plane) = lvl.load(world, world.level)
+
+    for sprite in tiles:
+        sprite.kill()
+
+    # Wrapping can be turned on or off like anything else in the level.
+    for sprite in world.g_decor:
+        if isinstance(sprite, decor.Wrapping):
+            sprite.kill()
+
+    if (tile >> 2) & 1:
+        decor.Wrapping(world, decor.Wrapping.POS_START)
+        decor.Wrapping(world, decor.Wrapping.POS_END)
+
+    # Dying starts the player from wherever the new level has it.
+    player.init_pos.update(player.subpixel(x * sprites.Player.WIDTH), player.subpixel(y * sprites.Player.HEIGHT))
+    player.init_direction = ((tile >> 3) & 1) != 0
+    world.init_bg = tilemap.PLANES[plane]
+
+    world.follow()
+
+    # Tiles are only around once they're streamed in, so this has to come after following.
+    if (
+        not world.tilemap.rect.contains(player.rect)
+        or world.tilemap.query(player.rect, (tilemap.SOLID | tilemap.HAZARD) & tilemap.ACTIVE[world.bg_color])
+    ):
+        player.regen()
+
+        world.set_bg(world.init_bg)
+        world.follow()
@@ -4,6 +4,8 @@ import sprites
 import decor
 import res
 import glob
+import tilemap
+import zlib
 
 # The starting level. In this case it's zero.
 START = 0
@@ -12,173 +14,259 @@ START = 0
 # Monoman assumes every level is named in a sequential order.
 MAX = len(glob.glob(res.path(os.path.join("res", "lvl", "*.lvl"))))
 
-level = 0 # Current level
-player = None # Current player if there is one
-init_bg = display.BLACK # Initial background outlined by the level.
+# The newest .lvl version that can be read. Version 1 files have no version byte and
+# are always the size of the screen.
+VERSION = 3
+V1_WIDTH = 32
+V1_HEIGHT = 16
 
-time = 0 # Total time the game has taken so far
-deaths = 0 # Total amount of deaths
+# Set on a tile byte when the byte after it is how many more times the tile repeats.
+FILL_FLAG = 0b00000001
 
-# State to handle the instruction text
-has_moved = False 
-has_flipped = False
+# The tile byte of a plain block, used for the walls around levels without wrapping.
+BLOCK_TILE = 0b10010000
 
-def init():
-    '''Re-initialize the level system, starting from the START constant.'''
-    global time
-    global deaths
+def init(world):
+    '''Re-initialize the level system of a world, starting from the START constant.'''
+    world.time = 0
+    world.deaths = 0
+    gen(world, START)
 
-    time = 0
-    deaths = 0
-    gen(START)
-
-def complete():
+def complete(world):
     '''Complete a level, moving on to the next one.'''
-    global level
-
     res.play_audio("exit")
 
-    nxt = level + 1
+    nxt = world.level + 1
+
+    if world.stats is not None:
+        world.stats.split(world, nxt >= MAX)
 
     # Don't generate any further if we've exceeded the actual level count
     if (nxt < MAX):
-        display.shake = 25
-        destroy()
-        gen(nxt)
+        world.shake = 25
+        destroy(world)
+        gen(world, nxt)
     else:
-        display.shake = 40
+        world.shake = 40
 
-def destroy():
+def destroy(world):
     '''Destroy the last level.'''
-    for sprite in sprites.g_entity:
+    for sprite in world.g_entity:
         sprite.kill()
 
-    for sprite in sprites.g_decor:
+    for sprite in world.g_decor:
         sprite.kill()   
 
-def regen():
+def regen(world):
     '''Regenerate the level.'''
-    global deaths
-
-    display.shake = 10
-    display.bg_color = init_bg
-    deaths += 1
+    world.shake = 10
+    world.set_bg(world.init_bg)
+    world.deaths += 1
 
-    for sprite in sprites.g_regen:
+    for sprite in world.g_regen:
         sprite.regen()
 
-def gen(idx):
-    '''Generates the level at idx.'''
-    global level
-    global init_bg
-    global player
+def spawn(world, plane, x, y, tile):
+    '''Creates the obstacle sprite for a .lvl tile byte at x, y in a plane.'''
+    # Figure out the type of sprite we are reading here.
+    # Once we do that, then we parse any other information and add that
+    # to the sprite instantiation procedure.
+    typ = (tile >> 4) & 0b111
+    color = tilemap.PLANES[plane]
+
+    if typ == 1:
+        return sprites.Block(world, (x, y), color)
+
+    if typ == 2:
+        return sprites.Unstable(world, (x, y), color)
+
+    if typ == 3:
+        direction = (tile >> 2) & 0b11
+        return sprites.Spike(world, (x, y), color, direction)
+
+    if typ == 4:
+        return sprites.Spring(world, (x, y), color)
+
+    if typ == 5:
+        return sprites.Exit(world, (x, y), color)
+
+    if typ == 7:
+        return sprites.Kill(world, (x, y))
+
+    if typ == 6:
+        return sprites.RgbExit(world, (x, y))
+
+    raise ValueError(f"cannot spawn tile {tile:#x}")
+
+def decode_plane(view, pos, data, width, height, stride):
+    '''
+    Decodes a plane of tile bytes in view starting at pos into data, a plane of TileMap.data.
+    Returns where the plane ended in view, and the player tile with its position if the
+    plane had one.
+    '''
+    size = width * height
+    end = len(view)
+    cursor = 0
+    player = None
 
+    while cursor < size:
+        if pos >= end:
+            raise ValueError("level data ends in the middle of a plane")
+
+        tile = view[pos]
+        pos += 1
+
+        # Empty space, which is already zeroed out in data.
+        if tile & 0x80 == 0:
+            cursor += tile + 1
+            continue
+
+        amount = 1
+
+        # Filled runs have the amount of times the tile repeats in the next byte.
+        if tile & FILL_FLAG:
+            if pos >= end:
+                raise ValueError("level data ends in the middle of a filled run")
+
+            amount = view[pos] + 2
+            tile &= ~FILL_FLAG
+            pos += 1
+
+        if cursor + amount > size:
+            raise ValueError("level data runs past the end of a plane")
+
+        if (tile >> 4) & 0b111 == 0:
+            # Players aren't stored in the map, as there's only ever one of them.
+            if amount > 1 or player is not None:
+                raise ValueError("cannot have more than one player in a level")
+
+            player = (tile, cursor % width, cursor // width)
+            cursor += 1
+        else:
+            # Fill the run in a row at a time, as rows are padded in the map.
+            while amount > 0:
+                y, x = divmod(cursor, width)
+                span = min(amount, width - x)
+                idx = (y * stride) + x + 1
+
+                data[idx:idx + span] = bytes([tile]) * span
+                cursor += span
+                amount -= span
+
+    if cursor != size:
+        raise ValueError("level data runs past the end of a plane")
+
+    return pos, player
+
+def load(world, idx):
+    '''
+    Reads the level at idx into a new TileMap for the given world, without creating a single
+    sprite. Returns the title of the level, and the player tile with its position and plane.
+    '''
     # Assume that the level name will be (idx).lvl
     path = res.lvl_path(idx)
 
     with open(path, "rb") as lvl:
-        # Ensure the identifier is present.
-        if lvl.read(3) != b"lvl":
-            raise ValueError(f"{path} is not a .lvl file")
+        view = memoryview(lvl.read())
 
-        title = ""
-        bg_color = display.BLACK
-        wrapping = False
+    # Ensure the identifier is present.
+    if view[:3] != b"lvl":
+        raise ValueError(f"{path} is not a .lvl file")
 
-        # Read the title first. This is the only header information.
-        while True:
-            byte = lvl.read(1)
-            if byte == b'\0':
-                break
+    # Versioned files have a version byte and the level size before the title.
+    # Titles are always printable, so anything that isn't must be a version.
+    version = 1
+    width, height = V1_WIDTH, V1_HEIGHT
+    pos = 3
 
-            title += chr(ord(byte))
+    if len(view) > pos and view[pos] != 0 and view[pos] < ord(' '):
+        version = view[pos]
 
-        # Generate a title sprite right now based on what we got.
-        decor.TitleText(title)
+        if version > VERSION:
+            raise ValueError(f"{path} is .lvl version {version}, which is too new")
 
-        # Simple reference for which colors correspond to which plane in the format.
-        plane_colors = [display.BLACK, display.GREY, display.WHITE]
+        width = int.from_bytes(view[pos + 1:pos + 3], "big")
+        height = int.from_bytes(view[pos + 3:pos + 5], "big")
+        pos += 5
 
-        for plane in range(3):
-            x = 0
-            y = 0
+    # Everything from version 3 onwards ends with a checksum of the rest of the file.
+    if version >= 3:
+        checksum = int.from_bytes(view[-4:], "big")
+        view = view[:-4]
 
-            for byte in iter(lambda: lvl.read(1), b''):
-                tile = int.from_bytes(byte, "big")
+        if zlib.crc32(view) != checksum:
+            raise ValueError(f"{path} is corrupted, its checksum doesn't match")
 
-                # If this tile isn't empty space...
-                if tile & 0x80 != 0:
-                    # Figure out the type of sprite we are reading here.
-                    # Once we do that, then we parse any other information and add that
-                    # to the sprite instantiation procedure.
-                    typ = (tile >> 4) & 0b111
+    # Read the title next. This is the last header information.
+    title_end = bytes(view[pos:]).find(b'\0')
 
-                    if typ == 0:
-                        bg_color = plane_colors[plane]
-                        wrapping = ((tile >> 2) & 1) != 0 
-                        direction = ((tile >> 3) & 1) != 0
+    if title_end < 0:
+        raise ValueError(f"{path} has no end to its title")
 
-                        player = sprites.Player((x, y), direction)
+    title = str(view[pos:pos + title_end], "latin-1")
+    pos += title_end + 1
 
-                    if typ == 1:
-                        sprites.Block((x, y), plane_colors[plane])
+    # Obstacles are only spawned once the camera gets close to them, so all we do
+    # here is put every tile in the TileMap.
+    world.tilemap = tilemap.TileMap(
+        width, height, lambda plane, x, y, tile: spawn(world, plane, x, y, tile)
+    )
 
-                    if typ == 2:
-                        sprites.Unstable((x, y), plane_colors[plane])
+    found = None
 
-                    if typ == 3:
-                        direction = (tile >> 2) & 0b11
-                        sprites.Spike((x, y), plane_colors[plane], direction)
+    for plane, data in enumerate(world.tilemap.data):
+        try:
+            pos, player = decode_plane(view, pos, data, width, height, world.tilemap.stride)
+        except ValueError as e:
+            raise ValueError(f"{path} is malformed: {e}") from None
 
-                    if typ == 4:
-                        sprites.Spring((x, y), plane_colors[plane])
+        if player is not None:
+            found = player + (plane,)
 
-                    if typ == 5:
-                        sprites.Exit((x, y), plane_colors[plane])
+    if found is None:
+        raise ValueError(f"{path} has no player")
 
-                    if typ == 7:
-                        sprites.Kill((x, y))
+    if not (found[0] >> 2) & 1:
+        # Without wrapping, there are two walls of blocks around the edges of the level.
+        for y in range(height - 1):
+            world.tilemap.set_tile(tilemap.PLANES.index(display.GREY), -1, y, BLOCK_TILE)
+            world.tilemap.set_tile(tilemap.PLANES.index(display.GREY), width, y, BLOCK_TILE)
 
-                    if typ == 6:
-                        sprites.RgbExit((x, y))
+    return title, found
 
-                    x += 1
+def gen(world, idx):
+    '''Generates the level at idx into the given world.'''
+    title, (tile, x, y, plane) = load(world, idx)
 
-                    if x > 31:
-                        x = 0
-                        y += 1
+    # Generate a title sprite right now based on what we got.
+    decor.TitleText(world, title)
 
-                        if y > 15:
-                            break
-                else:
-                    # This title is not empty space, figure out the amount to scroll and then
-                    # update the cursor to reflect that.
-                    scroll = tile + 1
-                    x += scroll
+    # The player is the only tile that always exists.
+    bg_color = tilemap.PLANES[plane]
+    wrapping = ((tile >> 2) & 1) != 0
+    direction = ((tile >> 3) & 1) != 0
 
-                    while x > 31:
-                        x -= 32
-                        y += 1
-
-                    if y > 15:
-                        break
+    player = sprites.FixedPlayer if world.fixed else sprites.Player
+    world.player = player(world, (x, y), direction)
 
     if wrapping:
         # Add wrapping decorations if needed
-        decor.Wrapping(decor.Wrapping.POS_START)
-        decor.Wrapping(decor.Wrapping.POS_END)
-    else:
-        # Otherwise generate two walls of blocks around the edges of the screen.
-        [sprites.Block((-1, y), display.GREY) for y in range(15)]
-        [sprites.Block((32, y), display.GREY) for y in range(15)]
+        decor.Wrapping(world, decor.Wrapping.POS_START)
+        decor.Wrapping(world, decor.Wrapping.POS_END)
 
     # Make sure the state reflects what we have just generated.
-    level = idx
-    init_bg = bg_color
-    display.bg_color = bg_color
-
-def get_time():
-    '''Formats the total time spent on this game, as a string.'''
+    world.level = idx
+    world.level_start = world.ticks
+    world.init_bg = bg_color
+    world.set_bg(bg_color)
+    world.follow()
+
+def get_time(world):
+    '''Formats the total time spent on a world's game, as a string.'''
+    return format_time(world.time)
+
+def format_time(time):
+    '''Formats a time in seconds as a string.'''
     # Theres probably a standard library method I could have used, but I didn't
     # really care.
     fmt_time = ""
@@ -1,29 +1,47 @@
 #!/usr/bin/env python3
 
+import argparse
+import sys
 import pygame
-import sprites
+import random
+import res
 import display
 import lvl
 import decor
-import random
-
-def title(screen):
-    sprites.destroy()
-
+import world
+import replay
+import ghost
+import sim
+import telemetry
+import stats
+import hotreload
+
+def title(screen, world):
     START_Y = 60
 
     clock = pygame.time.Clock()
 
-    # Set up the UI.
-    decor.LargeText("MONOMAN!", START_Y)
-    selector = decor.Selector(
-        decor.PlayButton("Play", START_Y + 48),
-        decor.SoundButton(START_Y + 80),
-        decor.ExitButton(START_Y + 112)
-    )
+    # Set up the UI, which is done again whenever we come back from another screen.
+    def setup():
+        world.destroy()
+
+        decor.LargeText(world, "MONOMAN!", START_Y)
+        return decor.Selector(
+            world,
+            decor.PlayButton(world, "Play", START_Y + 48),
+            decor.SoundButton(world, START_Y + 80),
+            decor.RecordsButton(world, START_Y + 112),
+            decor.ExitButton(world, START_Y + 144)
+        )
+
+    selector = setup()
+
+    # Menus only change when a key is pressed, so after the first frame we only draw
+    # a frame once there's input to react to.
+    idle = False
 
     while True:
-        for event in pygame.event.get():
+        for event in display.menu_events(idle):
             if event.type == pygame.QUIT:
                 return False
 
@@ -41,135 +59,207 @@ def title(screen):
                     if btn_type == decor.PlayButton.TYPE:
                         # Play, so return a "continue" flag.
                         return True
+                    elif btn_type == decor.RecordsButton.TYPE:
+                        if not records(screen, world):
+                            return False
+
+                        # Come back here once the best times have been looked at.
+                        selector = setup()
+                        idle = False
                     elif btn_type == decor.ExitButton.TYPE:
                         # Exit, so return a "stop" flag.
                         return False
 
         # All UI places itself on the stage.
-        sprites.g_stage.update()
+        world.g_stage.update()
 
-        screen.fill(display.BLACK_RGB)
-        sprites.g_stage.draw(screen)
+        world.render_ui(screen)
 
-        pygame.display.flip()
+        display.present(screen)
         clock.tick(display.FPS)
 
-def main(screen):
-    sprites.destroy()
+        idle = True
 
-    clock = pygame.time.Clock()
-    stage_surf = pygame.Surface((display.SWIDTH, display.SHEIGHT), pygame.SRCALPHA)
+def main(screen, world, record=None, tracks=(), watcher=None, counters=None):
+    stage_surf = res.surface((display.SWIDTH, display.SHEIGHT))
 
-    fade_alpha = 0
-    fade_ticks = 30
+    # Everything that happens from here on only depends on this seed and the input of every
+    # tick, which is all that is kept when recording.
+    seed = random.getrandbits(64)
+    recording = replay.Recording.start(world, seed)
+    run = replay.Run(world, seed)
 
-    lvl.init()
+    if world.stats is not None:
+        world.stats.start(world)
 
-    for i in range(20):
-        decor.Cloud((random.randint(0, display.SWIDTH), random.randint(0, display.SHEIGHT)))
+    for track in tracks:
+        ghost.Ghost(world, track)
 
-    decor.FlipIndicator()
+    # The run is stepped on a thread of its own from here on, which hands us a frame of every
+    # tick to draw. All we do is pass input along and draw the latest frame.
+    inputs = sim.Inputs()
+    simulation = sim.Simulation(run, recording, inputs, watcher)
+    simulation.start()
 
-    # These two text boxes are used as instructions once certain cases are met.
-    move_text = decor.FadingText("use wasd to move", (16, 160), 255, 15)
-    flip_text = decor.FadingText("use space to flip", (100, 160), 0, 15)
+    seen = 0
 
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return False
+    if counters is not None:
+        counters.start()
+
+    try:
+        while True:
+            pressed = 0
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return False
 
-            if lvl.player is not None:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_w:
-                        lvl.player.jump()
+                        pressed |= replay.INPUT_JUMP
 
                     if event.key == pygame.K_SPACE:
-                        lvl.player.flip()
+                        if not pressed & replay.INPUT_JUMP:
+                            pressed |= replay.INPUT_FLIP_FIRST
+
+                        pressed |= replay.INPUT_FLIP
+
+            inputs.press(pressed)
 
-        if lvl.player is not None:
             keys = pygame.key.get_pressed()
 
             if keys[pygame.K_d]:
-                lvl.player.move(sprites.Player.RIGHT)
+                inputs.hold(replay.INPUT_RIGHT)
             elif keys[pygame.K_a]:
-                lvl.player.move(sprites.Player.LEFT)
-            else:
-                lvl.player.moving = False
-
-        sprites.g_bg.update()
-        sprites.g_stage.update()
-        sprites.g_fg.update()
-
-        # The only time the player is gone is if they completed the game
-        # By entering the RGBExit. If thats the case, fade out and return
-        # The continue flag.
-        if lvl.player is None:
-            if fade_ticks > 0:
-                fade_ticks -= 1
+                inputs.hold(replay.INPUT_LEFT)
             else:
-                fade_alpha += 1
+                inputs.hold(0)
 
-                if fade_alpha == 255:
-                    return True
-        else:
-            # Keep marking time and handling the instruction display.
-            lvl.time += display.dt
+            count, frame, over = simulation.frames.wait(seen, 1 / display.FPS)
 
-            if not lvl.has_moved:
-                move_text.show()
-            else:
-                move_text.hide()
+            if simulation.error is not None:
+                raise simulation.error
 
-                if not lvl.has_flipped and lvl.player.rect.x >= 96:
-                    flip_text.show()
-                elif lvl.has_flipped:
-                    flip_text.hide()
+            # Once we've faded out after the RGBExit, return the continue flag.
+            if over:
+                return True
 
-        # First step is to draw the stage sprites, handling any shaking effect.
-        stage_surf.fill(display.TRANSPARENT_RGB)
-        sprites.g_stage.draw(stage_surf)
+            if count != seen:
+                seen = count
 
-        if display.shake > 0:
-            display.shake_surface(stage_surf)
-            display.shake -= 1
+                draw_calls, sprites_drawn = frame.draw(screen, stage_surf)
+                display.present(screen)
 
-        # Then fill the screen with the background color
-        screen.fill(display.bg_rgb())
+                if counters is not None:
+                    report = counters.count(draw_calls, sprites_drawn)
 
-        # Then draw the foreground, stage, and foreground.
-        sprites.g_bg.draw(screen)
-        screen.blit(stage_surf, pygame.Rect(0, 0, display.SWIDTH, display.SHEIGHT))
-        sprites.g_fg.draw(screen)
+                    if report is not None:
+                        print(report, file=sys.stderr)
+    finally:
+        simulation.stop()
 
-        # Apply the alpha to the surface, if we even have any.
-        display.fade_surface(screen, fade_alpha)
+        if record is not None:
+            recording.save(record)
 
-        pygame.display.flip()
-        clock.tick(display.FPS)
+def view(screen, world, recording, counters=None):
+    '''
+    Plays a recording back. Space pauses, the arrow keys go a second back or forward, or ten
+    with shift held, comma and period go a single tick back or forward, and the number keys
+    jump to that tenth of the recording.
+    '''
+    clock = pygame.time.Clock()
+    stage_surf = res.surface((display.SWIDTH, display.SHEIGHT))
+
+    run = recording.seek(world, 0)
+    tick = 0
+    length = len(recording.inputs)
+    paused = False
+
+    if counters is not None:
+        counters.start()
+
+    while True:
+        target = None
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+
+            if event.type == pygame.KEYDOWN:
+                jump = display.FPS * 10 if event.mod & pygame.KMOD_SHIFT else display.FPS
+
+                if event.key == pygame.K_ESCAPE:
+                    return
 
-    return False
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
 
-def end(screen):
-    sprites.destroy()
+                if event.key == pygame.K_LEFT:
+                    target = tick - jump
+                elif event.key == pygame.K_RIGHT:
+                    target = tick + jump
+                elif event.key == pygame.K_COMMA:
+                    target = tick - 1
+                elif event.key == pygame.K_PERIOD:
+                    target = tick + 1
+                elif pygame.K_0 <= event.key <= pygame.K_9:
+                    target = length * (event.key - pygame.K_0) // 10
 
+        if target is not None:
+            tick = max(0, min(target, length))
+            run = recording.seek(world, tick)
+        elif not paused and tick < length:
+            if run.step(recording.inputs[tick]):
+                paused = True
+
+            tick += 1
+
+        run.render(screen, stage_surf)
+
+        # Show how far along the recording we are at the bottom of the screen.
+        bar = pygame.Rect(0, display.SHEIGHT - 2, display.SWIDTH, 2)
+        screen.fill(display.GREY_RGB, bar)
+
+        bar.width = display.SWIDTH * tick // max(length, 1)
+        screen.fill([world.bg_inv()] * 3, bar)
+
+        display.present(screen)
+
+        if counters is not None:
+            report = counters.count(world.draw_calls, world.sprites_drawn)
+
+            if report is not None:
+                print(report, file=sys.stderr)
+        clock.tick(display.FPS)
+
+def end(screen, world):
     START_Y = 68
 
     clock = pygame.time.Clock()
     fade_alpha = 255
 
-    # Set up the UI.
-    decor.StaticText("You escaped!", START_Y)
-    decor.StaticText(f"Time: {lvl.get_time()}", START_Y + 16)
-    decor.StaticText(f"Deaths: {lvl.deaths}", START_Y + 32)
+    # Set up the UI, which is done again whenever we come back from another screen.
+    def setup():
+        world.destroy()
+
+        decor.StaticText(world, "You escaped!", START_Y)
+        decor.StaticText(world, f"Time: {lvl.get_time(world)}", START_Y + 16)
+        decor.StaticText(world, f"Deaths: {world.deaths}", START_Y + 32)
+
+        return decor.Selector(
+            world,
+            decor.PlayButton(world, "Play again", START_Y + 64),
+            decor.RecordsButton(world, START_Y + 96),
+            decor.ExitButton(world, START_Y + 128)
+        )
 
-    selector = decor.Selector(
-        decor.PlayButton("Play again", START_Y + 64),
-        decor.ExitButton(START_Y + 96)
-    )
+    selector = setup()
+
+    # Like the title screen, except that we keep drawing until we're done fading in.
+    idle = False
 
     while True:
-        for event in pygame.event.get():
+        for event in display.menu_events(idle):
             if event.type == pygame.QUIT:
                 return False
 
@@ -186,31 +276,162 @@ def end(screen):
                     
                     if btn_type == decor.PlayButton.TYPE:
                         return True
+                    elif btn_type == decor.RecordsButton.TYPE:
+                        if not records(screen, world):
+                            return False
+
+                        selector = setup()
+                        idle = False
                     elif btn_type == decor.ExitButton.TYPE:
                         return False
 
-        sprites.g_stage.update()
+        world.g_stage.update()
 
         # We actually fade into this screen, so we keep track of
         # an alpha value and apply it drawing to the screen.
         if fade_alpha > 0:
             fade_alpha -= 5
 
-        screen.fill(display.BLACK_RGB)
-        sprites.g_stage.draw(screen)
+        world.render_ui(screen)
         display.fade_surface(screen, fade_alpha)
 
-        pygame.display.flip()
+        display.present(screen)
+        clock.tick(display.FPS)
+
+        idle = fade_alpha <= 0
+
+def records(screen, world):
+    '''Shows the fastest runs and the fastest time every level has been completed in.'''
+    world.destroy()
+
+    START_Y = 16
+    RUNS = 3
+
+    clock = pygame.time.Clock()
+
+    # Set up the UI.
+    decor.LargeText(world, "BEST TIMES", START_Y)
+
+    best_runs = world.stats.best_runs(RUNS) if world.stats is not None else []
+    best_splits = world.stats.best_splits() if world.stats is not None else {}
+
+    for i in range(RUNS):
+        if i < len(best_runs):
+            time, deaths = best_runs[i]
+            line = f"{i + 1}. {lvl.format_time(time):>8} {deaths:>4} deaths"
+        else:
+            line = f"{i + 1}. {'--:--':>8}"
+
+        decor.StaticText(world, f"{line:<24}", START_Y + 28 + (i * 12))
+
+    # Levels go in two columns, the first half on the left.
+    half = -(-lvl.MAX // 2)
+
+    for row in range(half):
+        columns = []
+
+        for level in (row, row + half):
+            if level < lvl.MAX:
+                split = best_splits.get(level)
+                columns.append(f"{level + 1:>2} {lvl.format_time(split) if split is not None else '--:--':>8}")
+
+        decor.StaticText(world, "    ".join(columns), START_Y + 72 + (row * 12))
+
+    decor.Selector(world, decor.PlayButton(world, "Back", START_Y + 72 + (half * 12) + 8))
+
+    # Nothing here ever changes, so after the first frame we only draw once there's input.
+    idle = False
+
+    while True:
+        for event in display.menu_events(idle):
+            if event.type == pygame.QUIT:
+                return False
+
+            if event.type == pygame.KEYDOWN:
+                if event.key in [pygame.K_SPACE, pygame.K_RETURN, pygame.K_ESCAPE]:
+                    return True
+
+        world.g_stage.update()
+
+        world.render_ui(screen)
+
+        display.present(screen)
         clock.tick(display.FPS)
 
+        idle = True
+
+def scale(value):
+    '''Reads a --scale, where auto or 0 is the largest scale that fits on the desktop.'''
+    if value == "auto":
+        return 0
+
+    if int(value) < 0:
+        raise ValueError(value)
+
+    return int(value)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A small platformer about flipping between black and white.")
+    parser.add_argument("--scale", type=scale, default=1, help="how many times larger to draw the game, or auto to fit the desktop")
+    parser.add_argument("--fullscreen", action="store_true", help="fill the screen, scaling the game as far as it fits")
+    parser.add_argument("--record", metavar="PATH", help="record the inputs of every run to PATH, for export.py and --view")
+    parser.add_argument("--view", metavar="PATH", help="play back the run recorded in PATH instead of playing")
+    parser.add_argument("--fixed", action="store_true", help="do the player's physics in whole numbers, so runs play out the same anywhere")
+    parser.add_argument("--ghost", metavar="PATH", action="append", default=[], help="race against the run recorded in PATH, can be given many times")
+    parser.add_argument("--dev", action="store_true", help="reload levels as soon as they change in res/tmx or res/lvl, which recordings can't play back")
+    parser.add_argument("--perf", action="store_true", help="print what drawing frames costs every second")
+    parser.add_argument("--no-telemetry", action="store_true", help="don't keep track of where you go and die, for heatmap.py")
+    args = parser.parse_args()
+
     pygame.init()
 
-    screen = display.create()
+    screen = display.create(args.scale or display.best_scale(), args.fullscreen)
+    game = world.World()
 
-    if title(screen): # If title tells us to continue, go ahead to main, exit if not.
-        while main(screen): # And if main tells us to continue, go ahead to the end screen, exit if not.
-            if not end(screen): # If the player replays at the end screen, redo main, exit if not.
+    if args.fixed:
+        # The frame time is measured when starting up otherwise, which differs between machines.
+        display.dt = 1 / display.FPS
+        game.fixed = True
+
+    # Where the player goes and dies is kept in a file of its own for every session.
+    if not args.no_telemetry and args.view is None:
+        game.telemetry = telemetry.Session.start(res.cache_path("telemetry"))
+
+    if args.view is None:
+        game.stats = stats.Stats(res.cache_path("stats.db"))
+
+    counters = display.Counters() if args.perf else None
+    watcher = None
+
+    if args.dev:
+        watcher = hotreload.Watcher()
+        watcher.start()
+
+    tracks = []
+
+    for path in args.ghost:
+        recording = replay.Recording.load(path)
+
+        # Recordings from before tracks were kept have to be played through to find theirs.
+        tracks.append(recording.track if recording.track is not None else recording.trace(world.World()))
+
+    if args.view is not None:
+        view(screen, game, replay.Recording.load(args.view), counters)
+    elif title(screen, game): # If title tells us to continue, go ahead to main, exit if not.
+        while main(screen, game, args.record, tracks, watcher, counters): # And if main tells us to continue, go ahead to the end screen, exit if not.
+            if not end(screen, game): # If the player replays at the end screen, redo main, exit if not.
                 break
 
+    # Keep every sprite we had to bake around for next time.
+    res.sprite_cache.save()
+
+    if game.telemetry is not None:
+        game.telemetry.close()
+
+    if game.stats is not None:
+        game.stats.close()
+
+    if watcher is not None:
+        watcher.stop()
+
     pygame.quit()
\ No newline at end of file
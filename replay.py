@@ -0,0 +1,427 @@
+import sprites
+import display
+import decor
+import lvl
+import ghost
+import res
+import array
+import io
+import pickle
+import struct
+import sys
+import zlib
+
+# The input of a single tick of a Run, as bits. Jumping and flipping happen in the order they
+# were pressed, so a tick where flipping came first says so.
+INPUT_RIGHT      = 0b00001
+INPUT_LEFT       = 0b00010
+INPUT_JUMP       = 0b00100
+INPUT_FLIP       = 0b01000
+INPUT_FLIP_FIRST = 0b10000
+
+class Run():
+    '''
+    A single playthrough of the game in a world, from the first level until it has faded out
+    after the RGB exit. Everything that happens in a run only depends on its seed and the
+    input of every tick, which is what lets a Recording play it again exactly.
+    '''
+    def __init__(self, world, seed):
+        self.world = world
+
+        world.destroy()
+        world.rng.seed(seed)
+        world.shake = 0
+
+        lvl.init(world)
+
+        decor.sky(world, 20)
+        decor.FlipIndicator(world)
+
+        # These two text boxes are used as instructions once certain cases are met.
+        self.move_text = decor.FadingText(world, "use wasd to move", (16, 160), 255, 15)
+        self.flip_text = decor.FadingText(world, "use space to flip", (100, 160), 0, 15)
+
+        self.fade_alpha = 0
+        self.fade_ticks = 30
+
+    def step(self, inputs):
+        '''Runs a single tick with the given input bits. Returns whether the run is over.'''
+        world = self.world
+        player = world.player
+
+        if player is not None:
+            actions = [(INPUT_JUMP, player.jump), (INPUT_FLIP, player.flip)]
+
+            if inputs & INPUT_FLIP_FIRST:
+                actions.reverse()
+
+            for bit, action in actions:
+                if inputs & bit:
+                    action()
+
+            if inputs & INPUT_RIGHT:
+                player.move(sprites.Player.RIGHT)
+            elif inputs & INPUT_LEFT:
+                player.move(sprites.Player.LEFT)
+            else:
+                player.moving = False
+
+        world.update()
+
+        # The only time the player is gone is if they completed the game
+        # By entering the RGBExit. If thats the case, fade out and end the run.
+        if world.player is None:
+            if self.fade_ticks > 0:
+                self.fade_ticks -= 1
+            else:
+                self.fade_alpha += 1
+
+                if self.fade_alpha == 255:
+                    return True
+        else:
+            # Keep marking time and handling the instruction display.
+            world.time += display.dt
+
+            if not world.has_moved:
+                self.show(self.move_text)
+            else:
+                self.hide(self.move_text)
+
+                if not world.has_flipped and world.player.rect.x >= 96:
+                    self.show(self.flip_text)
+                elif world.has_flipped:
+                    self.hide(self.flip_text)
+
+        return False
+
+    def show(self, text):
+        # Texts that have faded out for good aren't kept in snapshots.
+        if text is not None:
+            text.show()
+
+    def hide(self, text):
+        if text is not None:
+            text.hide()
+
+    def frame(self):
+        '''Returns a Frame of how this run looks right now. See World.frame.'''
+        return self.world.frame(self.fade_alpha)
+
+    def render(self, screen, stage_surf):
+        '''Draws the current frame of this run to the screen.'''
+        world = self.world
+        world.draw_calls, world.sprites_drawn = self.frame().draw(screen, stage_surf)
+
+    def snapshot(self):
+        '''Returns the state of this run and its world as plain data. See World.snapshot.'''
+        state, saved = self.world.snapshot()
+
+        state["fade_alpha"] = self.fade_alpha
+        state["fade_ticks"] = self.fade_ticks
+        state["texts"] = [
+            saved.index(text) if text in saved else None for text in (self.move_text, self.flip_text)
+        ]
+
+        return state
+
+    @classmethod
+    def restore(cls, world, state):
+        '''Returns a run that carries on from a snapshot, in the given world.'''
+        run = cls.__new__(cls)
+        run.world = world
+
+        restored = world.restore(state)
+
+        run.fade_alpha = state["fade_alpha"]
+        run.fade_ticks = state["fade_ticks"]
+        run.move_text, run.flip_text = [None if idx is None else restored[idx] for idx in state["texts"]]
+
+        return run
+
+class SnapshotUnpickler(pickle.Unpickler):
+    '''
+    Unpickles snapshots, which are only ever plain data. Nothing else is let through, so a
+    recording from somewhere else can't run any code when it is loaded.
+    '''
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"snapshots can't contain {module}.{name}")
+
+class Recording():
+    '''
+    Everything needed to play a Run again, which is its seed, the frame time it ran with, and
+    the input of every tick it ran for. The Track of its player is kept as well, so that it
+    can be raced against without having to be played again, along with a keyframe of the
+    whole run every so often, so that any tick of it can be jumped to without having to play
+    everything before it. The checksum of the world after every tick is kept too, so that
+    playing it again can tell the exact tick it went differently on.
+    '''
+    MAGIC = b"mrep"
+    VERSION = 4
+
+    # Magic, version, seed, frame time, hints about how the run started, tick count.
+    HEADER = struct.Struct(">4sBQdBI")
+
+    # How many checksums there are. Then the size of the track, the ticks between keyframes
+    # and how many there are, and where every keyframe is from the end of the index and how
+    # large it is.
+    CHECKSUMS = struct.Struct(">I")
+    TRACK = struct.Struct(">I")
+    INDEX = struct.Struct(">II")
+    ENTRY = struct.Struct(">II")
+
+    HINT_MOVED = 0b001
+    HINT_FLIPPED = 0b010
+    HINT_FIXED = 0b100
+
+    # How many ticks apart keyframes are, which is also the most that seeking ever has to play.
+    KEYFRAME_TICKS = 300
+
+    def __init__(self, seed, dt, hints=0, inputs=b"", track=None, interval=KEYFRAME_TICKS, keyframes=()):
+        self.seed = seed
+        self.dt = dt
+        self.hints = hints
+        self.inputs = bytearray(inputs)
+
+        # World.checksum after every tick. Recordings from before version 4 have none.
+        self.checksums = array.array("I")
+
+        # Version 1 recordings have no track, which trace can make up for.
+        self.track = track
+
+        # Compressed snapshots of the run at every multiple of interval ticks, starting with
+        # the very first one. Recordings from before version 3 have none.
+        self.interval = interval
+        self.keyframes = list(keyframes)
+
+    @classmethod
+    def start(cls, world, seed):
+        '''Starts recording a Run that is about to start in world.'''
+        hints = (
+            (Recording.HINT_MOVED if world.has_moved else 0)
+            | (Recording.HINT_FLIPPED if world.has_flipped else 0)
+            | (Recording.HINT_FIXED if world.fixed else 0)
+        )
+
+        return cls(seed, display.dt, hints, track=ghost.Track())
+
+    def play(self, world):
+        '''Starts the recorded Run in world, returning it. Its inputs still have to be stepped through.'''
+        display.dt = self.dt
+
+        world.has_moved = bool(self.hints & Recording.HINT_MOVED)
+        world.has_flipped = bool(self.hints & Recording.HINT_FLIPPED)
+        world.fixed = bool(self.hints & Recording.HINT_FIXED)
+
+        return Run(world, self.seed)
+
+    def step(self, run, inputs):
+        '''
+        Steps run, the Run being recorded, with the input bits of its next tick, keeping
+        everything about the tick. Returns whether the run is over.
+        '''
+        if len(self.inputs) % self.interval == 0:
+            self.keyframes.append(zlib.compress(pickle.dumps(run.snapshot(), protocol=4)))
+
+        self.inputs.append(inputs)
+
+        over = run.step(inputs)
+        self.checksums.append(run.world.checksum)
+
+        if over:
+            return True
+
+        if self.track is not None:
+            self.track.sample(run.world)
+
+        return False
+
+    def keyframe(self, idx):
+        '''Returns the snapshot of the keyframe at idx.'''
+        try:
+            return SnapshotUnpickler(io.BytesIO(zlib.decompress(self.keyframes[idx]))).load()
+        except (zlib.error, pickle.UnpicklingError, EOFError) as e:
+            raise ValueError(f"keyframe {idx} is corrupted: {e}") from None
+
+    def seek(self, world, tick):
+        '''
+        Returns the recorded Run in world as it is after tick ticks, by restoring the last
+        keyframe before then and playing on from there. That never takes playing more than
+        interval ticks, however long the recording is.
+        '''
+        tick = max(0, min(tick, len(self.inputs)))
+        idx = min(tick // self.interval, len(self.keyframes) - 1)
+
+        if idx < 0:
+            run = self.play(world)
+            start = 0
+        else:
+            display.dt = self.dt
+            run = Run.restore(world, self.keyframe(idx))
+            start = idx * self.interval
+
+        # Everything on the way there would be heard at once otherwise.
+        audio_enabled = res.audio_enabled
+        res.audio_enabled = False
+
+        try:
+            for inputs in self.inputs[start:tick]:
+                if run.step(inputs):
+                    break
+        finally:
+            res.audio_enabled = audio_enabled
+
+        return run
+
+    def verify(self, world):
+        '''
+        Plays the recorded Run through in world without drawing it, checking the checksum of
+        every tick. Returns the first tick that didn't match, or None if every one did.
+        '''
+        audio_enabled = res.audio_enabled
+        res.audio_enabled = False
+
+        try:
+            run = self.play(world)
+
+            for tick, (inputs, checksum) in enumerate(zip(self.inputs, self.checksums)):
+                over = run.step(inputs)
+
+                if world.checksum != checksum:
+                    return tick
+
+                if over:
+                    break
+        finally:
+            res.audio_enabled = audio_enabled
+
+        return None
+
+    def trace(self, world):
+        '''Plays the recorded Run through in world without drawing it, returning the Track of its player.'''
+        track = ghost.Track()
+
+        # Playing changes the frame time, and nobody wants to hear a whole run at once.
+        dt, audio_enabled = display.dt, res.audio_enabled
+        res.audio_enabled = False
+
+        try:
+            run = self.play(world)
+
+            for inputs in self.inputs:
+                if run.step(inputs):
+                    break
+
+                track.sample(world)
+        finally:
+            display.dt, res.audio_enabled = dt, audio_enabled
+
+        return track
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(Recording.HEADER.pack(
+                Recording.MAGIC, Recording.VERSION, self.seed, self.dt, self.hints, len(self.inputs)
+            ))
+            f.write(self.inputs)
+
+            # Files are always big endian, like the header.
+            checksums = array.array("I", self.checksums)
+
+            if sys.byteorder == "little":
+                checksums.byteswap()
+
+            f.write(Recording.CHECKSUMS.pack(len(checksums)))
+            f.write(checksums.tobytes())
+
+            track = self.track.to_bytes() if self.track is not None else b""
+            f.write(Recording.TRACK.pack(len(track)))
+            f.write(track)
+
+            f.write(Recording.INDEX.pack(self.interval, len(self.keyframes)))
+            offset = 0
+
+            for keyframe in self.keyframes:
+                f.write(Recording.ENTRY.pack(offset, len(keyframe)))
+                offset += len(keyframe)
+
+            for keyframe in self.keyframes:
+                f.write(keyframe)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if len(data) < Recording.HEADER.size or data[:4] != Recording.MAGIC:
+            raise ValueError(f"{path} is not a recording")
+
+        magic, version, seed, dt, hints, count = Recording.HEADER.unpack_from(data)
+
+        if version > Recording.VERSION:
+            raise ValueError(f"{path} is recording version {version}, which is too new")
+
+        start = Recording.HEADER.size
+        inputs = data[start:start + count]
+
+        if len(inputs) != count:
+            raise ValueError(f"{path} is malformed: it has {len(inputs)} ticks instead of {count}")
+
+        recording = cls(seed, dt, hints, inputs)
+        rest = memoryview(data)[start + count:]
+
+        if rest and version < 2:
+            raise ValueError(f"{path} is malformed: it has {len(data) - start} ticks instead of {count}")
+
+        try:
+            if version == 2 and rest:
+                # Version 2 only has the track of the player after the inputs, if anything.
+                recording.track = ghost.Track.from_bytes(rest)
+            elif version >= 3:
+                recording.read_sections(rest, version)
+        except (ValueError, struct.error) as e:
+            raise ValueError(f"{path} is malformed: {e}") from None
+
+        return recording
+
+    def read_sections(self, view, version):
+        '''Reads everything that comes after the inputs of a recording in view.'''
+        pos = 0
+
+        if version >= 4:
+            count, = Recording.CHECKSUMS.unpack_from(view)
+            pos += Recording.CHECKSUMS.size
+
+            if count > len(self.inputs) or pos + (count * self.checksums.itemsize) > len(view):
+                raise ValueError("checksums are cut off")
+
+            self.checksums.frombytes(view[pos:pos + (count * self.checksums.itemsize)])
+            pos += count * self.checksums.itemsize
+
+            if sys.byteorder == "little":
+                self.checksums.byteswap()
+
+        size, = Recording.TRACK.unpack_from(view, pos)
+        pos += Recording.TRACK.size
+
+        if pos + size > len(view):
+            raise ValueError("track is cut off")
+
+        if size > 0:
+            self.track = ghost.Track.from_bytes(view[pos:pos + size])
+
+        pos += size
+
+        self.interval, count = Recording.INDEX.unpack_from(view, pos)
+        pos += Recording.INDEX.size
+
+        if self.interval == 0:
+            raise ValueError("keyframes are no ticks apart")
+
+        entries = [Recording.ENTRY.unpack_from(view, pos + (i * Recording.ENTRY.size)) for i in range(count)]
+        pos += count * Recording.ENTRY.size
+
+        for offset, size in entries:
+            if pos + offset + size > len(view):
+                raise ValueError("keyframe is cut off")
+
+            self.keyframes.append(bytes(view[pos + offset:pos + offset + size]))
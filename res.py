@@ -2,6 +2,9 @@ import pygame
 import display
 import sys
 import os
+import hashlib
+import mmap
+import struct
 
 def media_path(filename):
     return path(os.path.join("res", "media", filename))
@@ -19,21 +22,131 @@ def path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-spritesheet = pygame.image.load(media_path("spritesheet.png"))
+def cache_path(filename):
+    '''Returns the path of a file in the user's cache directory for monoman.'''
+    base_path = (
+        os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+
+    return os.path.join(base_path, "monoman", filename)
+
+# The spritesheet is only decoded once something isn't in the sprite cache.
+spritesheet = None
+
+def load_spritesheet():
+    global spritesheet
+
+    if spritesheet is None:
+        spritesheet = pygame.image.load(media_path("spritesheet.png"))
+
+    return spritesheet
 
 audios = {}
 audio_enabled = True
 
+# Every cache of surfaces made before the display existed, as (holder, names, rle) entries.
+# These are converted to the display format by convert_all once display.create is called.
+caches = []
+
 AUDIOS_CANCEL = ["spring", "die", "exit"]
 
 def image_at(rectangle):
-    # Find images at rect
+    # Find images at rect, going to the sprite cache first so that the spritesheet
+    # doesn't need to be decoded.
+    rect = pygame.Rect(rectangle)
+    image = sprite_cache.get(rect, "white")
+
+    if image is None:
+        image = pygame.Surface(rect.size, pygame.SRCALPHA)
+        image.fill((0, 0, 0, 0))
+        image.blit(load_spritesheet(), (0, 0), rect)
+
+        sprite_cache.put(rect, "white", image)
+
+    return prepare(image, rle=True)
+
+def mono_at(rectangle):
+    # Find the MonoSurface at rect, whose other palettes can then come from the sprite cache.
     rect = pygame.Rect(rectangle)
-    image = pygame.Surface(rect.size, pygame.SRCALPHA)
-    image.fill((0, 0, 0, 0))
-    image.blit(spritesheet, (0, 0), rect)
+    return sprite_cache.track(MonoSurface(image_at(rect), rect))
+
+def surface(size):
+    '''Creates a transparent surface to draw on, already in the display format if there is one.'''
+    return prepare(pygame.Surface(size, pygame.SRCALPHA))
+
+def prepare(surf, rle=False):
+    '''
+    Returns a surface in the same pixel format as the display, so blitting it doesn't have
+    to convert every pixel. With rle, surfaces that are mostly transparent are also run-length
+    encoded, which is only worth it for surfaces that are never drawn on again.
+    '''
+    if pygame.display.get_surface() is None:
+        return surf
+
+    alpha = surf.get_alpha()
+
+    if surf.get_flags() & pygame.SRCALPHA:
+        surf = surf.convert_alpha()
+    else:
+        surf = surf.convert()
+
+    if rle and alpha == 255 and is_sparse(surf):
+        surf.set_alpha(alpha, pygame.RLEACCEL)
+    elif alpha is not None:
+        surf.set_alpha(alpha)
 
-    return image
+    return surf
+
+def is_sparse(surf):
+    '''
+    Returns whether a surface is mostly transparent, with every other pixel being opaque.
+    Only these are run-length encoded, as blending translucent pixels that way can round
+    differently from a normal blit.
+    '''
+    visible = pygame.mask.from_surface(surf, 0).count()
+    opaque = pygame.mask.from_surface(surf, 254).count()
+
+    return visible == opaque and visible < (surf.get_width() * surf.get_height()) // 2
+
+def cache(holder, *names, rle=False):
+    '''
+    Registers cached surfaces so that they are converted to the display format once it exists.
+    holder is either a dict or list of surfaces [or lists of surfaces], or an object whose
+    attributes in names are surfaces. Returns holder.
+    '''
+    caches.append((holder, names, rle))
+    return holder
+
+def convert_all():
+    '''Converts every registered cache to the display format. Called once the display exists.'''
+    global spritesheet
+
+    if spritesheet is not None:
+        spritesheet = spritesheet.convert_alpha()
+
+    # Surfaces can be in more than one cache, so make sure they stay shared.
+    converted = {}
+
+    def convert(value, rle):
+        if isinstance(value, list):
+            value[:] = [convert(item, rle) for item in value]
+            return value
+
+        if id(value) not in converted:
+            converted[id(value)] = (value, prepare(value, rle))
+
+        return converted[id(value)][1]
+
+    for holder, names, rle in caches:
+        if isinstance(holder, dict):
+            for key in holder:
+                holder[key] = convert(holder[key], rle)
+        elif isinstance(holder, list):
+            convert(holder, rle)
+        else:
+            for name in names:
+                setattr(holder, name, convert(getattr(holder, name), rle))
 
 def load_strip(rect, image_count):
     # Load a strip of sprites, all with the same rect
@@ -41,7 +154,7 @@ def load_strip(rect, image_count):
             for x in range(image_count)]
 
     # Find images at several rects
-    return [MonoSurface(image_at(rect)) for rect in rects]
+    return [mono_at(rect) for rect in rects]
 
 def play_audio(name):
     if not audio_enabled:
@@ -68,18 +181,32 @@ class MonoSurface():
         "white": display.WHITE_RGB
     }
 
-    def __init__(self, surf):
+    def __init__(self, surf, rect=None):
         self.base = surf
-        self.surfs = {
+        self.surfs = cache({
             "white": self.base
-        }
+        }, rle=True)
+
+        # Where this surface is on the spritesheet, if it came from there.
+        self.rect = rect
 
     def get(self, color):
         '''Get a black/grey/white variation of the surface.'''
         assert color in MonoSurface.COLORS
 
         if color not in self.surfs:
-            self.surfs[color] = self.ppc(self.base, MonoSurface.COLORS[color])
+            surf = None
+
+            if self.rect is not None:
+                surf = sprite_cache.get(self.rect, color)
+
+            if surf is None:
+                surf = self.ppc(self.base, MonoSurface.COLORS[color])
+
+                if self.rect is not None:
+                    sprite_cache.put(self.rect, color, surf)
+
+            self.surfs[color] = prepare(surf, rle=True)
 
         return self.surfs[color]
 
@@ -101,3 +228,119 @@ class MonoSurface():
 
         return inv
 
+
+class SpriteCache():
+    '''
+    The pixels of every spritesheet image in every palette, kept in a file between launches.
+    The file is memory-mapped and its images are used as-is, so on a second launch nothing
+    has to be decoded from the spritesheet or recolored. It is thrown out whenever the
+    spritesheet changes.
+
+    The file is a header of "mspr", the version, the SHA-256 of spritesheet.png, and the amount
+    of images, followed by an x, y, width, height, palette, and offset for every image, and then
+    the BGRA pixels of each one.
+    '''
+    VERSION = 1
+
+    HEADER = struct.Struct(">4sB32sI")
+    ENTRY = struct.Struct(">HHHHBI")
+
+    PALETTES = list(MonoSurface.COLORS)
+
+    def __init__(self, path, sheet_path):
+        self.path = path
+
+        with open(sheet_path, "rb") as sheet:
+            self.sheet_hash = hashlib.sha256(sheet.read()).digest()
+
+        # Where every image is in the file, keyed by its rect and palette.
+        self.entries = {}
+        self.view = None
+
+        # Images that weren't in the file, and every MonoSurface they could come from.
+        self.new = {}
+        self.monos = {}
+
+        try:
+            with open(path, "rb") as file:
+                self.view = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+
+            self.read_index()
+        except (OSError, ValueError, struct.error):
+            # Either there is no cache yet or it's stale, so start over.
+            self.entries = {}
+            self.view = None
+
+    def read_index(self):
+        magic, version, sheet_hash, count = SpriteCache.HEADER.unpack_from(self.view)
+
+        if magic != b"mspr" or version != SpriteCache.VERSION or sheet_hash != self.sheet_hash:
+            raise ValueError("sprite cache is out of date")
+
+        index = self.view[SpriteCache.HEADER.size:SpriteCache.HEADER.size + (count * SpriteCache.ENTRY.size)]
+
+        for x, y, width, height, palette, offset in SpriteCache.ENTRY.iter_unpack(index):
+            if offset + (width * height * 4) > len(self.view):
+                raise ValueError("sprite cache is truncated")
+
+            self.entries[((x, y, width, height), SpriteCache.PALETTES[palette])] = offset
+
+    def get(self, rect, color):
+        '''Returns the cached image at rect in the given palette, or None if there isn't one.'''
+        key = (tuple(rect), color)
+
+        if key in self.new:
+            return self.new[key]
+
+        if key not in self.entries:
+            return None
+
+        offset = self.entries[key]
+        size = rect[2] * rect[3] * 4
+
+        return pygame.image.frombuffer(self.view[offset:offset + size], (rect[2], rect[3]), "BGRA")
+
+    def put(self, rect, color, surf):
+        '''Adds an image that wasn't cached, to be written out by save.'''
+        self.new[(tuple(rect), color)] = surf
+
+    def track(self, mono):
+        '''Remembers a MonoSurface from the spritesheet, so that save can bake all of its palettes.'''
+        self.monos[tuple(mono.rect)] = mono
+        return mono
+
+    def save(self):
+        '''Writes out the cache if anything was missing from it.'''
+        # Bake every palette now, so that the next launch doesn't have to.
+        for mono in self.monos.values():
+            for color in SpriteCache.PALETTES:
+                mono.get(color)
+
+        if not self.new:
+            return
+
+        images = {key: bytes(self.view[offset:offset + key[0][2] * key[0][3] * 4]) for key, offset in self.entries.items()}
+        images.update({key: pygame.image.tobytes(surf, "BGRA") for key, surf in self.new.items()})
+
+        header = SpriteCache.HEADER.pack(b"mspr", SpriteCache.VERSION, self.sheet_hash, len(images))
+        offset = SpriteCache.HEADER.size + (len(images) * SpriteCache.ENTRY.size)
+
+        index = bytearray()
+
+        for (rect, color), pixels in images.items():
+            index += SpriteCache.ENTRY.pack(*rect, SpriteCache.PALETTES.index(color), offset)
+            offset += len(pixels)
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            # Write to the side first, so a half-written cache is never picked up.
+            with open(self.path + ".tmp", "wb") as file:
+                file.write(header + index + b"".join(images.values()))
+
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            # Not being able to cache just means a slower launch next time.
+            pass
+
+sprite_cache = SpriteCache(cache_path("sprites.bin"), media_path("spritesheet.png"))
@@ -6,6 +6,11 @@ from xml.etree import ElementTree
 import os
 import glob
 
+import zlib
+
+# The version of .lvl that this script writes.
+VERSION = 3
+
 # --- TMX DATATYPES ---
 
 # Tiled GID transformation flags. This is meant for internal use by Tiled, but who cares.
@@ -131,7 +136,26 @@ class Empty():
     def render(self):
         return self.amount - 1
 
-def create_lvl(idx):
+# CLV representation of a tile repeated several times in a row. The amount
+# must be between MIN and MAX. Anything shorter than MIN is smaller as
+# separate tiles.
+class Fill():
+    MIN = 3
+    MAX = 257
+    FLAG = 0b00000001
+
+    def __init__(self, tile, amount):
+        assert amount >= Fill.MIN and amount <= Fill.MAX
+        self.tile = tile
+        self.amount = amount
+
+    def __repr__(self):
+        return f"{self.tile} for {self.amount} blocks"
+
+    def render(self):
+        return [self.tile.render() | Fill.FLAG, self.amount - 2]
+
+def create_lvl(idx, base="."):
     # --- STAGE 1: TRANSLATION ---
 
     # Parse the tiled document and extract the properties we want from it.
@@ -140,7 +164,7 @@ def create_lvl(idx):
     # the dev thinks it would be better to just graft PyTMX onto your
     # existing pygame project, but that's overkill for monoman and also a
     # total joke. Dependency moment.
-    document = ElementTree.parse("./tmx/" + str(idx) + ".tmx")
+    document = ElementTree.parse(os.path.join(base, "tmx", str(idx) + ".tmx"))
     root = document.getroot()
     props = {}
 
@@ -158,14 +182,18 @@ def create_lvl(idx):
         else:
             raise ValueError(f"unknown property {name}")
 
+    # Levels can be any size, so go off of the size of the map itself.
+    width = int(root.attrib["width"])
+    height = int(root.attrib["height"])
+
     # Now find every layer that we will parse.
     layers = [parse_layer(layer) for layer in root.findall("layer")]
 
     # Set up each CLV plane. By default, all spaces in these planes will
     # be None, the precursor to the Empty object that is created in stage 2.
-    black_plane = [None for i in range(16 * 32)]
-    grey_plane  = [None for i in range(16 * 32)]
-    white_plane = [None for i in range(16 * 32)]
+    black_plane = [None for i in range(width * height)]
+    grey_plane  = [None for i in range(width * height)]
+    white_plane = [None for i in range(width * height)]
     obstacle_planes = [black_plane, grey_plane, white_plane]
 
     player_exists = False
@@ -242,12 +270,13 @@ def create_lvl(idx):
     # Merger is pretty each, just add each plane together in order
     # to a single list.
     # However, compression involves merging all the None tiles into
-    # empty tile representations, which is a bit more involved.
+    # empty tile representations, and merging runs of the same tile into
+    # fill representations, which is a bit more involved.
     map_data = []
     empty_amount = 0
 
     for plane in [black_plane, grey_plane, white_plane]:
-        for tile in plane:
+        for tile in fill_runs(plane):
             if tile is None:
                 # Empty tile, increment the counter
                 empty_amount += 1
@@ -261,7 +290,7 @@ def create_lvl(idx):
                 if empty_amount > 0:
                     # Empty space preceded this tile
                     map_data.append(Empty(empty_amount))
-                    empty_amount = 0w
+                    empty_amount = 0
 
                 map_data.append(tile)
 
@@ -275,8 +304,11 @@ def create_lvl(idx):
     # Now we can turn every single tile into their binary representations.
     # This is the most straightfoward process
 
-    # Add our identifier and title first.
+    # Add our identifier, version, size, and title first.
     lvl = bytearray(b"lvl")
+    lvl.append(VERSION)
+    lvl += width.to_bytes(2, "big")
+    lvl += height.to_bytes(2, "big")
 
     for ch in props["title"]:
         lvl.append(ord(ch))
@@ -285,12 +317,42 @@ def create_lvl(idx):
 
     # Then append our tiles. These were already ordered in Stage 2.
     for tile in map_data:
-        lvl.append(tile.render())
+        if isinstance(tile, Fill):
+            lvl += bytes(tile.render())
+        else:
+            lvl.append(tile.render())
+
+    # Finish off with a checksum of everything before it.
+    lvl += zlib.crc32(lvl).to_bytes(4, "big")
 
     # Open up our output .lvl file and write out our data.
-    with open("./lvl/" + str(idx) + ".lvl", "wb") as file:
+    with open(os.path.join(base, "lvl", str(idx) + ".lvl"), "wb") as file:
         file.write(lvl)
 
+# Replace every run of the same tile in a plane with Fill instances.
+def fill_runs(plane):
+    merged = []
+    cursor = 0
+
+    while cursor < len(plane):
+        tile = plane[cursor]
+        amount = 1
+
+        if tile is not None and not isinstance(tile, Player):
+            while (cursor + amount < len(plane) and amount < Fill.MAX
+                    and plane[cursor + amount] is not None
+                    and plane[cursor + amount].render() == tile.render()):
+                amount += 1
+
+        if amount >= Fill.MIN:
+            merged.append(Fill(tile, amount))
+        else:
+            merged += plane[cursor:cursor + amount]
+
+        cursor += amount
+
+    return merged
+
 if __name__ == "__main__":
     # Assume that each .tmx is named N.tmx, where N is the level number.
     levels = glob.glob("tmx/*.tmx")
@@ -0,0 +1,126 @@
+import display
+import replay
+import threading
+import time
+
+class Inputs():
+    '''
+    The input bits for the next tick of a Simulation, gathered on one thread and taken on
+    another. Presses are kept until they are taken, so that a tap between two ticks is never
+    missed, while held keys only count for as long as they are held.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pressed = 0
+        self.held = 0
+
+    def press(self, bits):
+        '''Adds presses to the next tick, in the order they came after any that are already there.'''
+        with self.lock:
+            # A flip only comes first if no jump came before it.
+            if self.pressed & replay.INPUT_JUMP:
+                bits &= ~replay.INPUT_FLIP_FIRST
+
+            self.pressed |= bits
+
+    def hold(self, bits):
+        '''Sets which keys are held down right now.'''
+        with self.lock:
+            self.held = bits
+
+    def take(self):
+        '''Returns the input bits for the next tick, starting over on presses.'''
+        with self.lock:
+            bits = self.pressed | self.held
+            self.pressed = 0
+
+            return bits
+
+class FrameBuffer():
+    '''
+    Hands the Frames of a Simulation over to the thread drawing them. Frames never change once
+    taken, so handing one over is only a matter of swapping which one is the latest: the one
+    being drawn, the latest one and the one being made never get in each other's way. Only the
+    latest is ever kept, so drawing slower than the simulation skips frames instead of holding
+    it up.
+    '''
+    def __init__(self):
+        self.condition = threading.Condition()
+
+        self.frame = None
+        self.over = False
+
+        # How many frames have been handed over so far.
+        self.count = 0
+
+    def publish(self, frame, over=False):
+        '''Makes frame the latest one, and whether the simulation is over with it.'''
+        with self.condition:
+            self.frame = frame
+            self.over = over
+            self.count += 1
+
+            self.condition.notify_all()
+
+    def wait(self, seen, timeout):
+        '''
+        Waits up to timeout seconds for a frame after the first seen ones. Returns how many
+        frames there have been, the latest one and whether the simulation is over.
+        '''
+        with self.condition:
+            self.condition.wait_for(lambda: self.count != seen, timeout)
+
+            return self.count, self.frame, self.over
+
+class Simulation(threading.Thread):
+    '''
+    Steps a Run being recorded on a thread of its own, at a steady FPS ticks a second no
+    matter how long drawing takes, handing over a Frame of every tick through frames. Nothing
+    else may touch the world of the run until the simulation is over.
+
+    Levels that changed are swapped in between ticks if there's a hotreload.Watcher.
+    '''
+    def __init__(self, game, recording, inputs, watcher=None):
+        super().__init__(daemon=True)
+
+        self.game = game
+        self.recording = recording
+        self.inputs = inputs
+        self.watcher = watcher
+        self.frames = FrameBuffer()
+
+        self.stopping = threading.Event()
+
+        # Anything the simulation died of, to be raised again by whoever is waiting on it.
+        self.error = None
+
+    def run(self):
+        try:
+            due = time.perf_counter()
+
+            while not self.stopping.is_set():
+                if self.watcher is not None:
+                    self.watcher.apply(self.game.world)
+
+                over = self.recording.step(self.game, self.inputs.take())
+                self.frames.publish(self.game.frame(), over)
+
+                if over:
+                    return
+
+                due += 1 / display.FPS
+                delay = due - time.perf_counter()
+
+                if delay > 0:
+                    self.stopping.wait(delay)
+                else:
+                    # We've fallen behind, so carry on from now instead of rushing to catch up.
+                    due = time.perf_counter()
+        except BaseException as e:
+            self.error = e
+            self.frames.publish(None, True)
+
+    def stop(self):
+        '''Stops the simulation after the tick it is on, waiting for it to finish.'''
+        self.stopping.set()
+        self.join()
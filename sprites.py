@@ -5,38 +5,8 @@ import random
 import decor
 import lvl
 import math
-
-g_bg       = pygame.sprite.LayeredUpdates() # Drawn in the background, no shake
-g_stage    = pygame.sprite.LayeredUpdates() # Drawn with the shake effect
-g_fg       = pygame.sprite.LayeredUpdates() # Drawn above both layers, no shake
-
-# All entities
-g_entity   = pygame.sprite.Group()
-
-# All decoration sprites
-g_decor    = pygame.sprite.Group()
-
-# All collidable sprites, requites a method named "flash" that brightens
-# the sprite whenever it's in the way of a flip operation.
-g_collide  = pygame.sprite.Group()
-
-# All interactable sprites
-g_interact = pygame.sprite.Group()
-
-# All sprites that need to be regenerated, requires a method named "regen" that
-# regenerates the sprite when called.
-g_regen    = pygame.sprite.Group()
-
-def destroy():
-    '''Completely wipes the game of any preexisting entities.'''
-    for sprite in g_bg:
-        sprite.kill()
-
-    for sprite in g_stage:
-        sprite.kill()
-
-    for sprite in g_fg:
-        sprite.kill()
+import tilemap
+import telemetry
 
 class Player(pygame.sprite.Sprite):
     '''The main player sprite.'''
@@ -51,6 +21,11 @@ class Player(pygame.sprite.Sprite):
     GRAVITY      = 0.1
     TERMINAL_VEL = 10
 
+    # Anything slower than STOP_VEL stops, and anything falling faster than AIRBORNE_VEL
+    # is off the ground.
+    STOP_VEL     = 0.01
+    AIRBORNE_VEL = 0.5
+
     FLIP_COOLDOWN = 0.85
 
     ANIM_IDLE    = res.load_strip((0, 0,          WIDTH, HEIGHT), 4)
@@ -59,11 +34,16 @@ class Player(pygame.sprite.Sprite):
     ANIM_FALLING = res.load_strip((0, HEIGHT * 3, WIDTH, HEIGHT), 4)
     TICK_LIMIT   = 10
 
+    # Every animation, in the order they are numbered in snapshots.
+    ANIMS = [ANIM_IDLE, ANIM_WALKING, ANIM_JUMPING, ANIM_FALLING]
+
     LEFT  = True
     RIGHT = False
 
-    def __init__(self, pos, direction):
-        super().__init__(g_stage, g_entity, g_regen)
+    def __init__(self, world, pos, direction):
+        super().__init__(world.g_stage, world.g_entity, world.g_regen)
+
+        self.world = world
 
         # --- APPEARANCE ---
         self.anim = Player.ANIM_IDLE
@@ -73,13 +53,14 @@ class Player(pygame.sprite.Sprite):
         self.image = self.anim[self.anim_index].get("white")
         self.direction = direction
 
-        g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
+        world.g_stage.change_layer(self, display.STAGE_LAYER_PLAYER)
 
         # --- POSITIONING ---
-        self.pos = pygame.math.Vector2(pos[0] * Player.WIDTH, pos[1] * Player.HEIGHT)
+        self.pos = pygame.math.Vector2(self.subpixel(pos[0] * Player.WIDTH), self.subpixel(pos[1] * Player.HEIGHT))
 
         self.vel = pygame.math.Vector2(0, 0)
-        self.rect = self.image.get_rect(topleft = self.pos)
+        self.rect = self.image.get_rect(topleft = (self.pixel(self.pos.x), self.pixel(self.pos.y)))
+        self.path = [self.rect.copy()]
         self.on_ground = True
         self.moving = False
 
@@ -88,30 +69,45 @@ class Player(pygame.sprite.Sprite):
         self.init_pos = pygame.math.Vector2(self.pos.x, self.pos.y)
         self.init_direction = direction
 
+        # The player does something every tick, including counting down its flip cooldown.
+        world.wake(self)
+
     def update(self):
         self.interact()
+
+        # Keep track of all the space we moved through this tick, so that we can still
+        # interact with anything we passed over too quickly to actually overlap.
+        self.path = [self.rect.copy()]
+
         self.x_physics()
         self.y_physics()
         self.update_state()
         self.update_appearance()
 
     def interact(self):
-        collided = pygame.sprite.spritecollide(self, g_interact, False)
+        collided = self.world.tilemap.query(
+            self.path[0].unionall(self.path), tilemap.INTERACT & tilemap.ACTIVE[self.world.bg_color]
+        )
 
         for sprite in collided:
-            if sprite.color == display.bg_color:
+            if sprite.rect.collidelist(self.path) == -1:
+                # Only in the corner of our path's bounds, we never actually went through it.
                 continue
 
-            if type(sprite) in [Spike, Kill]:
-                self.die()
+            if sprite.KIND & tilemap.HAZARD:
+                # Dying regenerates the level, so anything else we touched is irrelevant now.
+                self.die(telemetry.DEATH_SPIKE if isinstance(sprite, Spike) else telemetry.DEATH_KILL)
+                return
 
-            if type(sprite) is Spring:
+            # Our path from the last tick can still cover a spring we just bounced off of,
+            # so only let it launch us if we aren't already on the way up.
+            if type(sprite) is Spring and self.vel.y >= 0:
                 res.play_audio("spring")
                 self.rect.bottom = sprite.rect.top + 1
-                self.vel.y = Player.SPRING_VEL
+                self.vel.y = self.SPRING_VEL
 
             if type(sprite) is Exit:
-                lvl.complete()
+                lvl.complete(self.world)
                 return
 
             if type(sprite) is RgbExit:
@@ -123,92 +119,124 @@ class Player(pygame.sprite.Sprite):
                 # If this is used outside of the last level, then it will just transport the player
                 # without problem.
                 self.kill()
-                lvl.player = None
-                lvl.complete()
+                self.world.player = None
+                lvl.complete(self.world)
                 return
 
     def x_physics(self):
-        # Apply any existing velocity
+        # Figure out where our velocity would take us. The rect does its own rounding, so
+        # let it handle turning our position into a pixel coordinate.
         self.pos.x += self.vel.x
-        self.rect.x = self.pos.x
+
+        target = self.rect.copy()
+        target.x = self.pixel(self.pos.x)
+        dx = target.x - self.rect.x
 
         # Apply friction. Make sure to round to zero if the velocity
         # is too low to be signifigant. 
-        self.vel.x *= Player.FRICTION
+        self.vel.x = self.damp(self.vel.x)
 
-        if abs(self.vel.x) < 0.01:
+        if abs(self.vel.x) < self.STOP_VEL:
             self.vel.x = 0
 
-        # Check for collisions
-        collided = pygame.sprite.spritecollide(self, g_collide, False)
-
-        for block in collided:
-            if block.color == display.bg_color:
-                continue
+        # Sweep towards where we want to go. Only the tiles that aren't hidden by the
+        # background are solid.
+        if dx != 0:
+            start = self.rect.copy()
+
+            travel, collided = self.world.tilemap.sweep(
+                self.rect, dx, 0, tilemap.SOLID & tilemap.ACTIVE[self.world.bg_color]
+            )
+
+            if collided:
+                # We hit the side of a wall, so clamp our colliding side to it.
+                # This should result in the velocity becoming zero.
+                self.rect.x += travel if dx > 0 else -travel
+                self.pos.x = self.subpixel(self.rect.x)
+                self.vel.x = 0
+            else:
+                self.rect.x = target.x
 
-            # Clamp our colliding side to the side of the wall.
-            if self.vel.x > 0:
-                self.rect.right = block.rect.left # We hit the left side of a wall
-            if self.vel.x < 0:
-                self.rect.left  = block.rect.right # We hit the right side of a wall
+            self.path.append(start.union(self.rect))
 
-            # Both collisions should result in the velocity becoming zero.
-            self.pos.x = self.rect.x
-            self.vel.x = 0
+        bounds = self.world.tilemap.rect
 
-        if self.rect.left > display.SWIDTH: # If player is offscreen
-            self.rect.left = 0 # Move player to opposite end of screen
-            self.pos.x = self.rect.left 
+        if self.rect.left > bounds.right: # If player is outside of the level
+            self.rect.left = 0 # Move player to opposite end of the level
+            self.pos.x = self.subpixel(self.rect.left)
+            self.path = [self.rect.copy()]
 
         elif self.rect.right < 0: # Opposite case
-            self.rect.right = display.SWIDTH
-            self.pos.x = self.rect.left
+            self.rect.right = bounds.right
+            self.pos.x = self.subpixel(self.rect.left)
+            self.path = [self.rect.copy()]
 
     def y_physics(self):
         self.pos.y += self.vel.y
-        self.rect.y = self.pos.y
 
-        self.vel.y += Player.GRAVITY
+        target = self.rect.copy()
+        target.y = self.pixel(self.pos.y)
+        dy = target.y - self.rect.y
 
-        if self.vel.y >= Player.TERMINAL_VEL:
-            self.vel.y = Player.TERMINAL_VEL
+        self.vel.y += self.GRAVITY
 
-        collided = pygame.sprite.spritecollide(self, g_collide, False)
+        if self.vel.y >= self.TERMINAL_VEL:
+            self.vel.y = self.TERMINAL_VEL
 
-        for block in collided:
-            if block.color == display.bg_color:
-                continue
+        if dy != 0:
+            start = self.rect.copy()
 
-            if self.vel.y > 0:
-                # We've hit the top of a block after going down.
-                # This means we are on the ground, so make sure that state is set.
-                self.rect.bottom = block.rect.top
-                self.on_ground = True
-                self.vel.y = 0
+            travel, collided = self.world.tilemap.sweep(
+                self.rect, 0, dy, tilemap.SOLID & tilemap.ACTIVE[self.world.bg_color]
+            )
 
-            if self.vel.y < 0:
-                # We've hit the bottom of a block after going up.
-                # Reset the velocity to prevent clipping and clamp our top.
-                self.rect.top = block.rect.bottom
+            if collided:
+                if dy > 0:
+                    # We've hit the top of a block after going down.
+                    # This means we are on the ground, so make sure that state is set.
+                    self.rect.y += travel
+                    self.on_ground = True
+                else:
+                    # We've hit the bottom of a block after going up.
+                    # Reset the velocity to prevent clipping and clamp our top.
+                    self.rect.y -= travel
+
+                self.pos.y = self.subpixel(self.rect.y)
                 self.vel.y = 0
 
-            self.pos.y = self.rect.y
+                # Every block we hit at the same time is touched, not just the first.
+                for block in collided:
+                    if block.KIND & tilemap.UNSTABLE:
+                        block.destroy()
+            else:
+                self.rect.y = target.y
 
-            if type(block) is Unstable:
-                block.destroy()
+            self.path.append(start.union(self.rect))
 
         # If we still have a y velocity after we check for collisions, we are not on the ground.
-        if abs(self.vel.y) > 0.5:
+        if abs(self.vel.y) > self.AIRBORNE_VEL:
             self.on_ground = False
 
         # Die if we've fallen out of the map
-        if self.rect.y > display.SHEIGHT:
-            self.die()
+        if self.rect.y > self.world.tilemap.rect.bottom:
+            self.die(telemetry.DEATH_FALL)
 
     def update_state(self):
         if self.flip_cooldown > 0:
             self.flip_cooldown -= display.dt
 
+    def pixel(self, value):
+        '''Returns the pixel a position is on. Rects round off floats by themselves.'''
+        return value
+
+    def subpixel(self, px):
+        '''Returns the position of a pixel, in the units positions are kept in.'''
+        return px
+
+    def damp(self, vel):
+        '''Returns what is left of a velocity after a tick of friction.'''
+        return vel * self.FRICTION
+
     def update_appearance(self):
         if not self.on_ground:
             # We're not on the ground, so were jumping or falling
@@ -232,9 +260,9 @@ class Player(pygame.sprite.Sprite):
             self.anim_index = (self.anim_index + 1) % 4
 
         # Then get the correct frame to use in the correct direction.
-        if display.bg_color == display.BLACK:
+        if self.world.bg_color == display.BLACK:
             frame = self.anim[self.anim_index].get("white")
-        elif display.bg_color == display.WHITE:
+        elif self.world.bg_color == display.WHITE:
             frame = self.anim[self.anim_index].get("black")
 
         if self.direction:
@@ -250,18 +278,18 @@ class Player(pygame.sprite.Sprite):
         self.direction = direction
 
         if self.direction:
-            self.vel.x -= Player.ACCELERATION
+            self.vel.x -= self.ACCELERATION
         else:
-            self.vel.x += Player.ACCELERATION
+            self.vel.x += self.ACCELERATION
 
-        lvl.has_moved = True
+        self.world.has_moved = True
 
     def jump(self):
         if self.on_ground:
             res.play_audio("jump")
             self.on_ground = False
-            self.vel.y = Player.JUMP_VEL
-            lvl.has_moved = True
+            self.vel.y = self.JUMP_VEL
+            self.world.has_moved = True
 
     def flip(self):
         '''Flip the background, if possible. If not, the "denied" sound will play and nothing will occur.'''
@@ -270,44 +298,131 @@ class Player(pygame.sprite.Sprite):
             res.play_audio("denied")
             return
 
-        self.flip_cooldown = Player.FLIP_COOLDOWN
+        self.flip_cooldown = self.FLIP_COOLDOWN
 
-        collided = pygame.sprite.spritecollide(self, g_collide, False)
+        # Any solid tiles that are currently hidden by the background would become solid
+        # once we flip, so check if we're inside any of those.
+        collided = self.world.tilemap.query(
+            self.rect, tilemap.SOLID & tilemap.HIDDEN[self.world.bg_color]
+        )
 
-        for sprite in collided:
-            if sprite.color == display.bg_color:
-                # We will flip into a solid object, deny this too and indicate
-                # the solid objects we can into. The cooldown is still applied 
-                # in this case as a punishment for trying to spam the flip action.
-                res.play_audio("denied")
-
-                for sprite in g_collide:
-                    if sprite.color == display.bg_color:
-                        sprite.flash(self.rect.center[0], self.rect.center[1])
-                
-                return
+        if collided:
+            # We will flip into a solid object, deny this too and indicate
+            # the solid objects we can into. The cooldown is still applied 
+            # in this case as a punishment for trying to spam the flip action.
+            res.play_audio("denied")
+
+            flashed = self.world.tilemap.flash_around(
+                self.rect.center, tilemap.SOLID & tilemap.HIDDEN[self.world.bg_color]
+            )
+
+            for tile in flashed:
+                self.world.wake(tile)
+
+            return
 
         res.play_audio("flip")
-        display.shake = 15
-        display.bg_color = display.bg_inv()
-        lvl.has_flipped = True
+        self.world.shake = 15
+        self.world.set_bg(self.world.bg_inv())
+        self.world.has_flipped = True
+
+    def die(self, cause):
+        '''Dies of one of the causes in telemetry, regenerating the level.'''
+        if self.world.telemetry is not None:
+            self.world.telemetry.death(self.world, self.rect.center, cause)
 
-    def die(self):
         # Generate some particles before regenerating the level.
         for i in range(0, 25):
-            decor.DeathParticle(self.rect.center)
+            decor.DeathParticle(self.world, self.rect.center)
 
         res.play_audio("die")
-        lvl.regen()
+        lvl.regen(self.world)
+
+    def snapshot(self):
+        '''Returns our state as plain data for World.snapshot.'''
+        return {
+            "pos": tuple(self.pos), "vel": tuple(self.vel), "rect": tuple(self.rect),
+            "path": [tuple(rect) for rect in self.path], "on_ground": self.on_ground, "moving": self.moving,
+            "direction": self.direction, "anim": Player.ANIMS.index(self.anim), "anim_ticks": self.anim_ticks,
+            "anim_index": self.anim_index, "flip_cooldown": self.flip_cooldown, "init_pos": tuple(self.init_pos),
+            "init_direction": self.init_direction,
+        }
+
+    @classmethod
+    def restore(cls, world, state):
+        '''Creates a player in the state of a snapshot, for World.restore.'''
+        player = cls(world, (0, 0), state["init_direction"])
+
+        player.pos.update(state["pos"])
+        player.vel.update(state["vel"])
+        player.rect = pygame.Rect(state["rect"])
+        player.path = [pygame.Rect(rect) for rect in state["path"]]
+        player.on_ground = state["on_ground"]
+        player.moving = state["moving"]
+        player.direction = state["direction"]
+        player.anim = Player.ANIMS[state["anim"]]
+        player.anim_ticks = state["anim_ticks"]
+        player.anim_index = state["anim_index"]
+        player.flip_cooldown = state["flip_cooldown"]
+        player.init_pos.update(state["init_pos"])
+
+        world.player = player
+
+        return player
 
     def regen(self):
         self.pos.x = self.init_pos.x
         self.pos.y = self.init_pos.y
+        self.rect.topleft = (self.pixel(self.pos.x), self.pixel(self.pos.y))
+        self.path = [self.rect.copy()]
         self.vel.x = 0
         self.vel.y = 0
         self.direction = self.init_direction
         self.flip_cooldown = 0
 
+class FixedPlayer(Player):
+    '''
+    A player whose physics only ever deal in whole thousandths of a pixel, instead of floats
+    that can come out differently depending on how they're done. Anything that would make a
+    fraction of one rounds towards zero, so that going left and right works out the same.
+    Positions and velocities are still kept in Vector2s, whose floats hold whole numbers this
+    small exactly.
+    '''
+    SUBPIXELS = 1000
+
+    ACCELERATION = 150
+    FRICTION     = 925 # Thousandths of the velocity left after every tick
+
+    JUMP_VEL     = -2750
+    SPRING_VEL   = -3500
+    GRAVITY      = 100
+    TERMINAL_VEL = 10000
+
+    STOP_VEL     = 10
+    AIRBORNE_VEL = 500
+
+    # Counted in ticks rather than seconds, so it doesn't depend on the frame time.
+    FLIP_COOLDOWN = 51
+
+    @staticmethod
+    def towards_zero(num, den):
+        '''Divides two whole numbers, rounding towards zero like int() does for floats.'''
+        quotient = abs(num) // den
+        return quotient if num >= 0 else -quotient
+
+    def update_state(self):
+        if self.flip_cooldown > 0:
+            self.flip_cooldown -= 1
+
+    def pixel(self, value):
+        return FixedPlayer.towards_zero(int(value), FixedPlayer.SUBPIXELS)
+
+    def subpixel(self, px):
+        return px * FixedPlayer.SUBPIXELS
+
+    def damp(self, vel):
+        return FixedPlayer.towards_zero(int(vel) * FixedPlayer.FRICTION, 1000)
+
 class ObstacleSprite(pygame.sprite.Sprite):
     '''The superclass for any non-moving sprite, collideable or interactable.'''
     WIDTH_MAX = 16
@@ -315,157 +430,270 @@ class ObstacleSprite(pygame.sprite.Sprite):
 
     INVIS_SURFACE = pygame.Surface((WIDTH_MAX, HEIGHT_MAX), pygame.SRCALPHA)
 
-    def __init__(self, pos, color, width, height, *groups):
-        super().__init__(g_stage, g_entity, groups)
+    # The kind of tile this sprite is in the TileMap.
+    KIND = 0
+
+    # Every plain filled surface an obstacle has used so far, keyed by size, color, and
+    # overall alpha. Obstacles in the same state all draw the same surface.
+    SURFACES = res.cache({}, rle=True)
+
+    def __init__(self, world, pos, color, width, height, *groups):
+        super().__init__(world.g_stage, world.g_entity, groups)
+
+        self.world = world
 
         # Transform the 32x16 coordinates into pixel coordinates.
         self.rect = pygame.Rect(
             ObstacleSprite.WIDTH_MAX * pos[0], ObstacleSprite.HEIGHT_MAX * pos[1], width, height
         )
 
-        self.image = pygame.Surface((width, height), pygame.SRCALPHA)
         self.color = color
 
         self.x, self.y = pos
-        self.flash_intensity = 0
 
-    def flash(self, x, y):
-        # Find the distance from this object and the other object.
-        distance = ((self.rect.center[0] - x) ** 2 + (self.rect.center[1] - y) ** 2) ** 0.5
+        # Where we are in the TileMap.
+        self.plane = tilemap.PLANES.index(color)
+        self.cell = world.tilemap.index(self.x, self.y)
 
-        if distance > 96:
-            # Too far away to flash.
-            return
+        if self.KIND != 0:
+            world.tilemap.add(self, self.KIND)
+
+        # The key of the shared surface we're drawing, if we use one.
+        self.surface_key = None
+
+    def apply_flash(self):
+        '''
+        Draws any flash from a denied flip over our image, fading it out as we go. Returns
+        whether there was a flash to draw.
+        '''
+        flash = self.world.tilemap.flash[self.plane]
+
+        if self.color != self.world.bg_color:
+            flash[self.cell] = 0
+
+        if flash[self.cell] > 0:
+            bg = self.world.bg_inv()
+            self.use_surface([bg, bg, bg, flash[self.cell]], self.image.get_alpha())
+            flash[self.cell] = max(flash[self.cell] - 5, 0)
+
+            return True
+
+        return False
 
-        self.flash_intensity = ((96 - distance) / 96) * 128
+    def snapshot(self):
+        '''
+        Returns our state as plain data for World.snapshot. Obstacles are spawned again with
+        the rest of the level when a world is restored, and then given this with restore_state.
+        '''
+        return {"surface": self.surface_key}
+
+    def restore_state(self, state):
+        '''Brings an obstacle that was just spawned back to the state of a snapshot.'''
+        if state["surface"] is not None:
+            size, rgba, alpha = state["surface"]
+            self.use_surface(rgba, alpha)
+
+    def use_surface(self, rgba, alpha=255):
+        '''Use a shared surface of our size filled with rgba, drawn at an overall alpha.'''
+        key = (self.rect.size, tuple(rgba), alpha)
+        self.surface_key = key
+
+        if key not in ObstacleSprite.SURFACES:
+            surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+            surface.fill(rgba)
+            surface.set_alpha(alpha)
+
+            ObstacleSprite.SURFACES[key] = res.prepare(surface, rle=True)
+
+        self.image = ObstacleSprite.SURFACES[key]
+
+res.cache(ObstacleSprite, "INVIS_SURFACE", rle=True)
 
 class AnimatedSprite(ObstacleSprite):
-    '''A sprite with animation.'''
+    '''
+    A sprite with animation. Every animated sprite follows the same clock, so sprites
+    with the same animation and color share a single set of frames and never have to
+    update themselves.
+    '''
     TICK_LIMIT = 10
 
-    def __init__(self, pos, color, width, height, *groups):
-        super().__init__(pos, color, width, height, groups)
+    COLOR_NAMES = {display.BLACK: "black", display.GREY: "grey", display.WHITE: "white"}
 
-        self.anim_index = 0
-        self.anim_ticks = 0
+    # Every set of frames rendered so far, keyed by animation name and color.
+    FRAMES = res.cache({}, rle=True)
 
-    def update(self):
-        self.anim_ticks += 1
+    def __init__(self, world, pos, color, width, height, *groups):
+        super().__init__(world, pos, color, width, height, groups)
 
-        if self.anim_ticks == AnimatedSprite.TICK_LIMIT:
-            self.anim_ticks = 0
-            self.anim_index = (self.anim_index + 1) % 4
+    @property
+    def image(self):
+        if self.color == self.world.bg_color:
+            return ObstacleSprite.INVIS_SURFACE
 
-    def apply_anim(self, anim):
-        if self.color != display.bg_color:
-            if self.color == display.BLACK:
-                self.image = anim[self.anim_index].get("black")
-            elif self.color == display.WHITE:
-                self.image = anim[self.anim_index].get("white")
-            else:
-                self.image = anim[self.anim_index].get("grey")
-        else:
-            self.image = ObstacleSprite.INVIS_SURFACE
+        return self.frames[(self.world.ticks // AnimatedSprite.TICK_LIMIT) % 4]
+
+    def use_frames(self, name, render):
+        '''Use the shared frames of an animation, rendering them in our color if nobody has yet.'''
+        key = (name, self.color)
+
+        if key not in AnimatedSprite.FRAMES:
+            AnimatedSprite.FRAMES[key] = render(self.color)
+
+        self.frames = AnimatedSprite.FRAMES[key]
+
+    def use_strip(self, name, strip):
+        '''Like use_frames, but with a strip of MonoSurfaces from res.load_strip.'''
+        self.use_frames(name, lambda color: [frame.get(AnimatedSprite.COLOR_NAMES[color]) for frame in strip])
 
 class Block(ObstacleSprite):
-    '''A static, collideable block.'''
+    '''
+    A static, collideable block. Blocks sleep unless they are flashing, and are only woken
+    up to redraw themselves when the background color changes.
+    '''
     WIDTH = 16
     HEIGHT = 16
 
-    def __init__(self, pos, color):
-        super().__init__(pos, color, Block.WIDTH, Block.HEIGHT, g_collide)
+    KIND = tilemap.SOLID
 
-    def update(self):
-        self.image.fill([self.color, self.color, self.color, (self.color != display.bg_color) * 255])
+    def __init__(self, world, pos, color):
+        super().__init__(world, pos, color, Block.WIDTH, Block.HEIGHT, world.g_recolor)
+
+        self.update()
 
-        # Handle flash component from ObstacleSprite.
-        if self.color != display.bg_color:
-            self.flash_intensity = 0
+    def update(self):
+        self.use_surface([self.color, self.color, self.color, (self.color != self.world.bg_color) * 255])
 
-        if self.flash_intensity > 0:
-            bg = display.bg_inv()
-            self.image.fill([bg, bg, bg, self.flash_intensity])
-            self.flash_intensity = max(self.flash_intensity - 5, 0)
+        # Handle flash component from ObstacleSprite, which keeps us awake until it fades.
+        if not self.apply_flash():
+            self.world.sleep(self)
 
 class Unstable(ObstacleSprite):
-    '''A static, collideable block that disappears when collided with.'''
+    '''
+    A static, collideable block that disappears when collided with. Breaking and coming back
+    are timed with the world's timers, so an unstable block only wakes up when it actually
+    has something to do.
+    '''
     WIDTH = 16
     HEIGHT = 8
 
     GRACE_TICKS = 0.1
     DEAD_TICKS  = 3
 
-    def __init__(self, pos, color):
-        super().__init__(pos, color, Unstable.WIDTH, Unstable.HEIGHT, g_collide, g_regen)
+    KIND = tilemap.SOLID | tilemap.UNSTABLE
+
+    def __init__(self, world, pos, color):
+        super().__init__(world, pos, color, Unstable.WIDTH, Unstable.HEIGHT, world.g_regen, world.g_recolor)
 
         # --- STATE ---
         self.broken = False
-        self.grace_ticks = 0
-        self.dead_ticks = 0
+        self.crumbling = False
+        self.fading = False
+        self.timer = None
 
         # --- APPEARANCE ---
         self.color = color
+        self.alpha = 255
+
+        self.update()
 
     def update(self):
-        if self.broken:
-            if self.grace_ticks > 0:
-                # Give some grace time before the tile breaks.
-                self.grace_ticks -= display.dt
+        if self.crumbling:
+            self.crumbling = False
 
-                if self.grace_ticks <= 0:
-                    res.play_audio("break")
+            res.play_audio("break")
 
-                    # When the sprite breaks, just make it uncollideable and invisible
-                    # and generate some particles to denote it.
-                    g_collide.remove(self)
-                    self.image.set_alpha(0)
-                    self.dead_ticks = Unstable.DEAD_TICKS
+            # When the sprite breaks, just make it uncollideable and invisible
+            # and generate some particles to denote it.
+            self.world.tilemap.set_solid(self, False)
+            self.alpha = 0
 
-                    for i in range(0, 10):
-                        decor.CrumbleParticle(self.rect.center, self.color)
+            for i in range(0, 10):
+                decor.CrumbleParticle(self.world, self.rect.center, self.color)
 
-            if self.dead_ticks > 0:
-                # Give some time until we respawn
-                self.dead_ticks -= display.dt
+            # Give some time until we respawn. This tick already counts towards it.
+            self.timer = self.world.schedule(display.ticks_for(Unstable.DEAD_TICKS) - 1, self.respawn)
 
+        if self.fading:
             # "broken" period ended, time to fade back in.
-            if self.dead_ticks <= 0 and self.image.get_alpha() < 255:
-                self.image.set_alpha(self.image.get_alpha() + 15)
+            self.alpha += 15
 
-                if self.image.get_alpha() == 255:
-                    # Only become collideable when we are fully opaque.
-                    g_collide.add(self)
-                    self.broken = False
+            if self.alpha == 255:
+                # Only become collideable when we are fully opaque.
+                self.world.tilemap.set_solid(self, True)
+                self.broken = False
+                self.fading = False
 
         # Since we already tinker with the overall alpha component in the above blocks, here
         # just fill in the alpha component with whether this sprite should be visible
-        self.image.fill(
-            [self.color, self.color, self.color, (self.color != display.bg_color) * 255]
+        self.use_surface(
+            [self.color, self.color, self.color, (self.color != self.world.bg_color) * 255], self.alpha
         )
 
-        # Handle flash component from ObstacleSprite.
-        if self.color != display.bg_color:
-            self.flash_intensity = 0
-
-        if self.flash_intensity > 0:
-            bg = display.bg_inv()
-            self.image.fill([bg, bg, bg, self.flash_intensity])
-            self.flash_intensity = max(self.flash_intensity - 5, 0)
+        # Handle flash component from ObstacleSprite. We stay awake for as long as we are
+        # fading in or flashing.
+        if not self.apply_flash() and not self.fading:
+            self.world.sleep(self)
             
     def destroy(self):
-        '''"Breaks" this block.'''
+        '''"Breaks" this block, after a grace period.'''
         if not self.broken:
             self.broken = True
-            self.grace_ticks = Unstable.GRACE_TICKS
+            self.timer = self.world.schedule(display.ticks_for(Unstable.GRACE_TICKS), self.crumble)
+
+    def snapshot(self):
+        state = super().snapshot()
+
+        solid = self.world.tilemap.bits[self.cell] & tilemap.SOLID & tilemap.PLANE_BITS[self.plane]
+        timer = self.timer
+
+        if timer is not None and not timer.cancelled and timer.due > self.world.ticks:
+            timer = (timer.due, timer.callback.__name__)
+        else:
+            timer = None
+
+        state.update(
+            broken=self.broken, crumbling=self.crumbling, fading=self.fading, alpha=self.alpha,
+            solid=bool(solid), timer=timer
+        )
+
+        return state
+
+    def restore_state(self, state):
+        self.broken = state["broken"]
+        self.crumbling = state["crumbling"]
+        self.fading = state["fading"]
+        self.alpha = state["alpha"]
+
+        self.world.tilemap.set_solid(self, state["solid"])
+
+        if state["timer"] is not None:
+            due, callback = state["timer"]
+            self.timer = self.world.schedule(due - self.world.ticks, getattr(self, callback))
+
+        super().restore_state(state)
+
+    def crumble(self):
+        '''Ends the grace period, so that we break on our next update.'''
+        self.crumbling = True
+        self.world.wake(self)
+
+    def respawn(self):
+        '''Ends the broken period, so that we start fading back in on our next update.'''
+        self.fading = True
+        self.world.wake(self)
 
     def regen(self):
-        self.image.set_alpha(255)
+        if self.timer is not None:
+            self.timer.cancel()
+
+        self.alpha = 255
         self.broken = False
-        self.grace_ticks = 0
-        self.dead_ticks = 0
+        self.crumbling = False
+        self.fading = False
+        self.timer = None
 
-        if self not in g_collide:
-            g_collide.add(self)
+        self.world.tilemap.set_solid(self, True)
+        self.world.wake(self)
 
 class Spike(AnimatedSprite):
     '''A bed of spikes that kills the player.'''
@@ -487,28 +715,28 @@ class Spike(AnimatedSprite):
     DIR_LEFT  = 1
     DIR_DOWN  = 2
     DIR_RIGHT = 3
+
+    KIND = tilemap.HAZARD | tilemap.INTERACT
     
-    def __init__(self, pos, color, direction):
+    def __init__(self, world, pos, color, direction):
         if direction == Spike.DIR_UP:
-            super().__init__(pos, color, Spike.WIDTH_V, Spike.HEIGHT_V, g_interact)
+            super().__init__(world, pos, color, Spike.WIDTH_V, Spike.HEIGHT_V)
             self.anim = Spike.ANIM_UP
             self.rect.y += self.rect.height
         elif direction == Spike.DIR_DOWN:
-            super().__init__(pos, color, Spike.WIDTH_V, Spike.HEIGHT_V, g_interact)
+            super().__init__(world, pos, color, Spike.WIDTH_V, Spike.HEIGHT_V)
             self.anim = Spike.ANIM_DOWN
         elif direction == Spike.DIR_LEFT:
-            super().__init__(pos, color, Spike.WIDTH_H, Spike.HEIGHT_H, g_interact)
+            super().__init__(world, pos, color, Spike.WIDTH_H, Spike.HEIGHT_H)
             self.anim = Spike.ANIM_LEFT
             self.rect.x += self.rect.width
         elif direction == Spike.DIR_RIGHT:
             self.anim = Spike.ANIM_RIGHT
-            super().__init__(pos, color, Spike.WIDTH_H, Spike.HEIGHT_H, g_interact)
+            super().__init__(world, pos, color, Spike.WIDTH_H, Spike.HEIGHT_H)
         else:
             raise Exception("invalid direction was provided")
 
-    def update(self):
-        super().update()
-        super().apply_anim(self.anim)
+        self.use_strip(("spike", direction), self.anim)
 
 class Spring(AnimatedSprite):
     '''A spring that allows the player to jump higher.'''
@@ -518,13 +746,13 @@ class Spring(AnimatedSprite):
     # Make our anim a static member so we can re-use it's surfaces
     ANIM = res.load_strip((0, 80, WIDTH, HEIGHT), 4) 
 
-    def __init__(self, pos, color):
-        super().__init__(pos, color, Spring.WIDTH, Spring.HEIGHT, g_interact)
+    KIND = tilemap.INTERACT
+
+    def __init__(self, world, pos, color):
+        super().__init__(world, pos, color, Spring.WIDTH, Spring.HEIGHT)
         self.rect.y += self.rect.height
 
-    def update(self):
-        super().update()
-        super().apply_anim(Spring.ANIM)
+        self.use_strip("spring", Spring.ANIM)
 
 class Exit(AnimatedSprite):
     '''The level exit.'''
@@ -533,23 +761,32 @@ class Exit(AnimatedSprite):
 
     INSET_ANIM = [4, 5, 7, 5]
 
-    def __init__(self, pos, color):
-        super().__init__(pos, color, Exit.WIDTH, Exit.HEIGHT, g_interact)
+    KIND = tilemap.INTERACT
 
-    def update(self):
-        super().update()
+    def __init__(self, world, pos, color):
+        super().__init__(world, pos, color, Exit.WIDTH, Exit.HEIGHT)
+        self.use_frames("exit", lambda color: Exit.render_frames([color] * 3))
 
+    @staticmethod
+    def render_frames(rgb):
+        '''Renders the animation of an exit in the given color.'''
         # Be a bit clever and make a rect animation instead of a normal sprite
         # animation. This allows us to optimize space on the spritesheet.
-        inset = Exit.INSET_ANIM[self.anim_index]
-
-        self.image.fill(display.TRANSPARENT_RGB)
-        pygame.draw.rect(
-            self.image, 
-            [self.color, self.color, self.color, (self.color != display.bg_color) * 255],
-            pygame.Rect(inset, inset, Exit.WIDTH - inset * 2, Exit.HEIGHT - inset * 2),
-            1
-        )
+        frames = []
+
+        for inset in Exit.INSET_ANIM:
+            frame = pygame.Surface((Exit.WIDTH, Exit.HEIGHT), pygame.SRCALPHA)
+
+            pygame.draw.rect(
+                frame,
+                rgb,
+                pygame.Rect(inset, inset, Exit.WIDTH - inset * 2, Exit.HEIGHT - inset * 2),
+                1
+            )
+
+            frames.append(res.prepare(frame, rle=True))
+
+        return frames
 
 class RgbExit(AnimatedSprite):
     '''Like Exit, but colorful and it also ends the game.'''
@@ -558,43 +795,52 @@ class RgbExit(AnimatedSprite):
 
     COLORS = [(255, 0, 0), (255, 128, 0), (255, 192, 0), (16, 200, 32), (0, 32, 255), (0, 128, 255), (128, 0, 255)]
 
-    def __init__(self, pos):
-        super().__init__(pos, display.GREY, RgbExit.WIDTH, RgbExit.HEIGHT, g_interact)
-        self.color_index = 0
+    KIND = tilemap.INTERACT
 
-    def update(self):
+    def __init__(self, world, pos):
+        super().__init__(world, pos, display.GREY, RgbExit.WIDTH, RgbExit.HEIGHT)
+
+        # Our frames are the typical exit animation, once in each of our colors.
+        self.use_frames(
+            "rgbexit", lambda color: [frame for rgb in RgbExit.COLORS for frame in Exit.render_frames(rgb)]
+        )
+
+        # Sleep until the first tick that changes a frame, which is a tick after the clock
+        # rolls over.
+        ticks = world.ticks + 1
+        world.schedule(1 + (1 - ticks) % AnimatedSprite.TICK_LIMIT, self.wake)
+
+    @property
+    def image(self):
         # We have to deal with animation logic ourselves, as this animation contains a far more complicated
-        # sequence of frames and effects.
-        if self.anim_ticks == 0:
-            # Generate some particles every time we change a frame.
-            decor.RgbParticle(self.rect.center)
-            decor.RgbParticle(self.rect.center)
+        # sequence of frames and effects. Every time the exit animation "inverts" on its fourth frame, 
+        # change the color.
+        step = self.world.ticks // AnimatedSprite.TICK_LIMIT
+        color_index = ((step + 1) // 4) % 6
 
-        self.anim_ticks += 1
+        return self.frames[(color_index * 4) + (step % 4)]
 
-        if self.anim_ticks == AnimatedSprite.TICK_LIMIT:
-            self.anim_ticks = 0
-            self.anim_index = (self.anim_index + 1) % 4
+    def update(self):
+        # Generate some particles every time we change a frame.
+        decor.RgbParticle(self.world, self.rect.center)
+        decor.RgbParticle(self.world, self.rect.center)
 
-            if self.anim_index == 3:
-                # Every time the exit animation "inverts", change the color.
-                self.color_index = (self.color_index + 1) % 6
-        
-        # Then do the typical exit animation.
-        inset = Exit.INSET_ANIM[self.anim_index]
-
-        self.image.fill(display.TRANSPARENT_RGB)
-        pygame.draw.rect(
-            self.image, 
-            RgbExit.COLORS[self.color_index],
-            pygame.Rect(inset, inset, Exit.WIDTH - inset * 2, Exit.HEIGHT - inset * 2),
-            1
-        )
+        self.world.sleep(self)
+        self.world.schedule(AnimatedSprite.TICK_LIMIT, self.wake)
+
+    def wake(self):
+        '''Wakes us up, unless we've been removed since.'''
+        if self.alive():
+            self.world.wake(self)
 
 class Kill(ObstacleSprite):
     '''Unused sprite meant to kill the player if they do into out-of-bounds areas.'''
     WIDTH = 16
     HEIGHT = 16
 
-    def __init__(self, pos):
-        super().__init__(pos, display.GREY, Kill.WIDTH, Exit.HEIGHT, g_interact)
\ No newline at end of file
+    KIND = tilemap.HAZARD | tilemap.INTERACT
+
+    def __init__(self, world, pos):
+        super().__init__(world, pos, display.GREY, Kill.WIDTH, Exit.HEIGHT)
+
+        self.image = ObstacleSprite.INVIS_SURFACE
\ No newline at end of file
@@ -0,0 +1,144 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id       INTEGER PRIMARY KEY, -- When the run started, in nanoseconds since the epoch
+    fixed    INTEGER NOT NULL,    -- Whether the physics were done in whole numbers
+    time     REAL,                -- How long the whole run took, if it was finished
+    deaths   INTEGER              -- How many times the player died in the whole run, if it was finished
+);
+
+CREATE TABLE IF NOT EXISTS splits (
+    run      INTEGER NOT NULL REFERENCES runs (id),
+    level    INTEGER NOT NULL,
+    time     REAL NOT NULL,       -- How long the level took
+    deaths   INTEGER NOT NULL     -- How many times the player died in the level
+);
+
+CREATE INDEX IF NOT EXISTS runs_best ON runs (time) WHERE time IS NOT NULL;
+CREATE INDEX IF NOT EXISTS splits_best ON splits (level, time);
+CREATE INDEX IF NOT EXISTS splits_run ON splits (run);
+'''
+
+class Stats():
+    '''
+    Keeps the time and deaths of every run and every level completed in it in an SQLite
+    database. Nothing is ever written while playing: every change is queued up for a thread
+    of its own, which writes everything that has piled up since it last wrote in a single
+    transaction. Reading is done on whatever thread asks, after waiting for the writer to
+    catch up.
+    '''
+    def __init__(self, path):
+        self.path = path
+
+        # The run being played right now, and the time and deaths when its last level started.
+        self.run = None
+        self.split_time = 0
+        self.split_deaths = 0
+
+        # Connections can only be used on the thread that made them, this one is for reading.
+        self.reader = None
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    def start(self, world):
+        '''Starts counting a new run in world.'''
+        self.run = time.time_ns()
+        self.split_time = world.time
+        self.split_deaths = world.deaths
+
+        self.queue.put(("INSERT INTO runs (id, fixed) VALUES (?, ?)", (self.run, world.fixed)))
+
+    def split(self, world, finished):
+        '''Counts the level world is on as completed, and the whole run if it's finished.'''
+        if self.run is None:
+            return
+
+        self.queue.put((
+            "INSERT INTO splits (run, level, time, deaths) VALUES (?, ?, ?, ?)",
+            (self.run, world.level, world.time - self.split_time, world.deaths - self.split_deaths)
+        ))
+
+        self.split_time = world.time
+        self.split_deaths = world.deaths
+
+        if finished:
+            self.queue.put(("UPDATE runs SET time = ?, deaths = ? WHERE id = ?", (world.time, world.deaths, self.run)))
+            self.run = None
+
+    def write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            connection = sqlite3.connect(self.path)
+
+            # Readers never hold up the writer this way, or the other way around.
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            print(f"could not open stats in {self.path}: {e}", file=sys.stderr)
+            connection = None
+
+        while True:
+            batch = [self.queue.get()]
+
+            while not self.queue.empty():
+                batch.append(self.queue.get())
+
+            statements = [statement for statement in batch if statement is not None]
+
+            if connection is not None and statements:
+                try:
+                    with connection:
+                        for sql, params in statements:
+                            connection.execute(sql, params)
+                except sqlite3.Error as e:
+                    print(f"could not write stats to {self.path}: {e}", file=sys.stderr)
+
+            for statement in batch:
+                self.queue.task_done()
+
+            # Closing always comes last.
+            if batch[-1] is None:
+                if connection is not None:
+                    connection.close()
+
+                return
+
+    def query(self, sql, params=()):
+        '''Returns every row sql finds, once everything queued up so far has been written.'''
+        self.queue.join()
+
+        try:
+            if self.reader is None:
+                self.reader = sqlite3.connect(self.path)
+
+            return self.reader.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"could not read stats from {self.path}: {e}", file=sys.stderr)
+            return []
+
+    def best_runs(self, limit):
+        '''Returns the time and deaths of the fastest finished runs, fastest first.'''
+        return self.query(
+            "SELECT time, deaths FROM runs WHERE time IS NOT NULL ORDER BY time LIMIT ?", (limit,)
+        )
+
+    def best_splits(self):
+        '''Returns the fastest time every level has been completed in, by level.'''
+        return dict(self.query("SELECT level, min(time) FROM splits GROUP BY level"))
+
+    def close(self):
+        '''Writes everything queued up so far, waiting for the writer to be done.'''
+        self.queue.put(None)
+        self.writer.join()
+
+        if self.reader is not None:
+            self.reader.close()
@@ -0,0 +1,224 @@
+import array
+import operator
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# What killed the player. Every cause has its own heatmap of where it happened.
+DEATH_SPIKE = 0
+DEATH_KILL  = 1
+DEATH_FALL  = 2
+CAUSES = ["spike", "kill", "fall"]
+
+# How many pixels wide and tall every cell of a heatmap is, which is half a tile.
+CELL_SIZE = 8
+
+# How many ticks apart the position of the player is sampled for the path heatmap.
+SAMPLE_TICKS = 6
+
+class Heatmap():
+    '''
+    How many times the player went through every cell of a level, and how many times they
+    died in it of every cause. Every map is a flat array with a count per cell, row by row.
+    '''
+    def __init__(self, level, width, height):
+        self.level = level
+        self.width = width
+        self.height = height
+
+        self.path = array.array("I", bytes(4 * width * height))
+        self.deaths = [array.array("I", bytes(4 * width * height)) for cause in CAUSES]
+
+    @classmethod
+    def for_world(cls, world):
+        '''Makes an empty heatmap for the level world is on.'''
+        return cls(
+            world.level,
+            -(-world.tilemap.rect.width // CELL_SIZE),
+            -(-world.tilemap.rect.height // CELL_SIZE)
+        )
+
+    def cell(self, pos):
+        '''Returns the index of the cell pos is in, keeping anything outside the level at its edge.'''
+        x = min(max(int(pos[0]) // CELL_SIZE, 0), self.width - 1)
+        y = min(max(int(pos[1]) // CELL_SIZE, 0), self.height - 1)
+
+        return (y * self.width) + x
+
+    def maps(self):
+        return [self.path] + self.deaths
+
+    def merge(self, other):
+        '''Adds the counts of another heatmap of the same level onto this one.'''
+        for mine, theirs in zip(self.maps(), other.maps()):
+            mine[:] = array.array("I", map(operator.add, mine, theirs))
+
+    # Level, width, height.
+    HEADER = struct.Struct(">BHH")
+
+    def to_bytes(self):
+        maps = [array.array("I", counts) for counts in self.maps()]
+
+        # Files are always big endian.
+        if sys.byteorder == "little":
+            for counts in maps:
+                counts.byteswap()
+
+        return Heatmap.HEADER.pack(self.level, self.width, self.height) + b"".join(
+            counts.tobytes() for counts in maps
+        )
+
+    @classmethod
+    def from_bytes(cls, view, pos):
+        '''Reads a heatmap from view at pos, returning it and where it ended.'''
+        level, width, height = Heatmap.HEADER.unpack_from(view, pos)
+        pos += Heatmap.HEADER.size
+
+        heatmap = cls(level, width, height)
+        size = 4 * width * height
+
+        for counts in heatmap.maps():
+            if pos + size > len(view):
+                raise ValueError("heatmap is cut off")
+
+            counts[:] = array.array("I", bytes(view[pos:pos + size]))
+            pos += size
+
+            if sys.byteorder == "little":
+                counts.byteswap()
+
+        return heatmap, pos
+
+class Session():
+    '''
+    Collects heatmaps of every level played in a single session of the game. Counting is
+    all that happens while playing. Whenever a level is left, everything so far is handed to
+    a thread of its own, which writes it to disk, replacing what it wrote before.
+    '''
+    MAGIC = b"mtel"
+    VERSION = 1
+
+    # Magic, version, level count.
+    HEADER = struct.Struct(">4sBB")
+
+    def __init__(self, path):
+        self.path = path
+        self.heatmaps = {}
+
+        # The heatmap of the level being played right now, so finding it is only a check.
+        self.current = None
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    @classmethod
+    def start(cls, directory):
+        '''Starts a session that is written to a file of its own in directory.'''
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.mtel"
+        return cls(os.path.join(directory, name))
+
+    def heatmap(self, world):
+        '''Returns the heatmap of the level world is on.'''
+        current = self.current
+
+        if current is None or current.level != world.level:
+            if current is not None:
+                # Moving on from a level is a good time to save what we have.
+                self.flush()
+
+            current = self.heatmaps.get(world.level)
+
+            if current is None:
+                current = self.heatmaps[world.level] = Heatmap.for_world(world)
+
+            self.current = current
+
+        return current
+
+    def tick(self, world):
+        '''Samples where the player of world is, every SAMPLE_TICKS ticks.'''
+        player = world.player
+
+        if player is not None and world.ticks % SAMPLE_TICKS == 0:
+            heatmap = self.heatmap(world)
+            heatmap.path[heatmap.cell(player.rect.center)] += 1
+
+    def death(self, world, pos, cause):
+        '''Counts the player of world dying at pos of one of the causes.'''
+        heatmap = self.heatmap(world)
+        heatmap.deaths[cause][heatmap.cell(pos)] += 1
+
+    def flush(self):
+        '''Hands everything collected so far over to be written, without waiting for it.'''
+        # Only copying the counts happens here, compressing them is left to the writer.
+        self.queue.put((len(self.heatmaps), [
+            heatmap.to_bytes() for level, heatmap in sorted(self.heatmaps.items())
+        ]))
+
+    def close(self):
+        '''Writes everything collected so far, waiting for the writer to be done.'''
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+
+    def write(self):
+        while True:
+            items = [self.queue.get()]
+
+            while not self.queue.empty():
+                items.append(self.queue.get())
+
+            # Only the latest counts are worth writing, anything older is part of them.
+            latest = [item for item in items if item is not None]
+
+            if latest:
+                self.save(*latest[-1])
+
+            # Closing always comes last.
+            if items[-1] is None:
+                return
+
+    def save(self, count, heatmaps):
+        data = Session.HEADER.pack(Session.MAGIC, Session.VERSION, count) + zlib.compress(b"".join(heatmaps))
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            # Write it next to the old file first, so that a crash never leaves it half written.
+            with open(self.path + ".tmp", "wb") as f:
+                f.write(data)
+
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"could not write telemetry to {self.path}: {e}", file=sys.stderr)
+
+def load(path):
+    '''Returns the heatmaps in a session file, by level.'''
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < Session.HEADER.size or data[:4] != Session.MAGIC:
+        raise ValueError(f"{path} is not a telemetry file")
+
+    magic, version, count = Session.HEADER.unpack_from(data)
+
+    if version > Session.VERSION:
+        raise ValueError(f"{path} is telemetry version {version}, which is too new")
+
+    try:
+        view = memoryview(zlib.decompress(data[Session.HEADER.size:]))
+        heatmaps = {}
+        pos = 0
+
+        for i in range(count):
+            heatmap, pos = Heatmap.from_bytes(view, pos)
+            heatmaps[heatmap.level] = heatmap
+    except (zlib.error, struct.error, ValueError) as e:
+        raise ValueError(f"{path} is malformed: {e}") from None
+
+    return heatmaps
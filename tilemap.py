@@ -0,0 +1,364 @@
+import pygame
+import display
+from array import array
+
+TILE_SIZE = 16
+
+# Sprites are only created for the chunks of a level near the camera. This is the size
+# of those chunks, in tiles.
+CHUNK_SIZE = 16
+
+# The color each plane corresponds to, in the same order as the planes in a .lvl file.
+PLANES = [display.BLACK, display.GREY, display.WHITE]
+
+# Every cell in a TileMap is a 12-bit word made up of four per-plane bitmaps,
+# one bit per plane for each kind of tile. The bit of a kind in a certain plane
+# is found with KIND & PLANE_BITS[plane].
+SOLID    = 0b000000000111 # Collides with the player
+UNSTABLE = 0b000000111000 # Unstable tiles, whether they are currently solid or not
+HAZARD   = 0b000111000000 # Kills the player on contact
+INTERACT = 0b111000000000 # Does something on contact
+ALL      = 0b111111111111
+
+PLANE_BITS = [0b001001001001 << plane for plane in range(len(PLANES))]
+
+# The bits that are actually "real" with a given background color, which are every
+# plane except the one with the same color as the background. Flipping the background
+# is then just a matter of using another mask.
+ACTIVE = {color: ALL & ~PLANE_BITS[plane] for plane, color in enumerate(PLANES)}
+
+# The opposite of ACTIVE, the bits that would become real if the background was flipped.
+HIDDEN = {color: PLANE_BITS[plane] for plane, color in enumerate(PLANES)}
+
+# How far a denied flip reaches, and how bright it makes the tiles it reaches.
+FLASH_RADIUS = 96
+FLASH_MAX = 128
+
+# Precomputed flash intensities for every squared distance within FLASH_RADIUS, which
+# lets a flash get away with never taking a square root.
+FLASH_FALLOFF = bytes(
+    int(((FLASH_RADIUS - (d2 ** 0.5)) / FLASH_RADIUS) * FLASH_MAX) for d2 in range(FLASH_RADIUS ** 2 + 1)
+)
+
+class Shape():
+    '''
+    A rectangle of neighbouring solid tiles of the same kind in a plane, which collides
+    as if it was a single tile.
+    '''
+    def __init__(self, plane, rect):
+        self.plane = plane
+        self.rect = rect
+
+def contact(rect, dx, dy, other):
+    '''Returns how far rect can move along dx or dy before it touches other.'''
+    if dx > 0:
+        return other.left - rect.right
+    elif dx < 0:
+        return rect.left - other.right
+    elif dy > 0:
+        return other.top - rect.bottom
+    else:
+        return rect.top - other.bottom
+
+class TileMap():
+    '''
+    The tiles of a level, alongside a grid of occupancy bitmaps for every obstacle sprite
+    that currently exists. This allows collision checks to only look at the few tiles under
+    a rect instead of every sprite.
+
+    Levels can be far larger than the screen, so sprites are only spawned for the chunks
+    near the camera, with the tiles of every other chunk just being kept as .lvl tile bytes.
+    The solid tiles of each chunk are merged into Shapes as it comes in, so a floor collides
+    as one rect instead of a rect for every block in it.
+    '''
+    def __init__(self, width, height, spawn=None):
+        self.width = width
+        self.height = height
+        self.rect = pygame.Rect(0, 0, width * TILE_SIZE, height * TILE_SIZE)
+
+        # Pad each row with an extra column on both ends, so that the walls placed
+        # just outside of the level still have somewhere to go.
+        self.stride = width + 2
+
+        # The .lvl tile byte at every cell of every plane, and the function that turns
+        # one into a sprite with spawn(plane, x, y, tile).
+        self.data = [bytearray(self.stride * height) for plane in PLANES]
+        self.spawn = spawn
+
+        # The sprites of every chunk that currently exists, by chunk coordinates.
+        self.chunks = {}
+
+        self.bits = array("H", bytes(2 * self.stride * height))
+        self.tiles = [[None] * (self.stride * height) for plane in PLANES]
+
+        # The Shape every solid tile is merged into, which is what collisions are done with.
+        self.shapes = [[None] * (self.stride * height) for plane in PLANES]
+
+        # How brightly each tile is flashing right now.
+        self.flash = [bytearray(self.stride * height) for plane in PLANES]
+
+    def index(self, x, y):
+        '''Returns the index of the cell at tile coordinates x, y.'''
+        return (y * self.stride) + x + 1
+
+    def set_tile(self, plane, x, y, tile):
+        '''Set the .lvl tile byte at x, y in a plane. This only has an effect once the chunk is streamed in.'''
+        self.data[plane][self.index(x, y)] = tile
+
+    def add(self, sprite, kind):
+        '''Add an obstacle sprite to the map as the given kind of tile.'''
+        if sprite.y < 0 or sprite.y >= self.height:
+            return
+
+        self.tiles[sprite.plane][sprite.cell] = sprite
+        self.bits[sprite.cell] |= kind & PLANE_BITS[sprite.plane]
+
+        # Solid tiles collide on their own until their chunk gets merged.
+        if kind & SOLID:
+            self.shapes[sprite.plane][sprite.cell] = Shape(sprite.plane, sprite.rect.copy())
+
+    def remove(self, sprite):
+        '''Remove an obstacle sprite from the map.'''
+        if self.tiles[sprite.plane][sprite.cell] is sprite:
+            self.tiles[sprite.plane][sprite.cell] = None
+            self.bits[sprite.cell] &= ~PLANE_BITS[sprite.plane]
+            self.flash[sprite.plane][sprite.cell] = 0
+            self.shapes[sprite.plane][sprite.cell] = None
+
+    def set_solid(self, sprite, solid):
+        '''Make a previously added sprite solid or not.'''
+        bit = SOLID & PLANE_BITS[sprite.plane]
+
+        if bool(self.bits[sprite.cell] & bit) == solid:
+            return
+
+        if solid:
+            self.bits[sprite.cell] |= bit
+        else:
+            self.bits[sprite.cell] &= ~bit
+
+        # The shapes around this tile no longer line up with what's solid, so redo them.
+        self.merge(sprite.x // CHUNK_SIZE, sprite.y // CHUNK_SIZE, sprite.plane)
+
+    def query(self, rect, mask):
+        '''Returns every tile with any bit in mask set that overlaps the given rect.'''
+        x_start = max(rect.left // TILE_SIZE, -1)
+        x_end = min((rect.right - 1) // TILE_SIZE, self.width)
+        y_start = max(rect.top // TILE_SIZE, 0)
+        y_end = min((rect.bottom - 1) // TILE_SIZE, self.height - 1)
+
+        found = []
+
+        for y in range(y_start, y_end + 1):
+            row = self.index(0, y)
+
+            for x in range(x_start, x_end + 1):
+                bits = self.bits[row + x] & mask
+
+                if bits == 0:
+                    continue
+
+                # Something's here, figure out which planes it's in and do the actual
+                # rect test, as not every tile takes up the entire cell.
+                for plane, plane_bits in enumerate(PLANE_BITS):
+                    if bits & plane_bits:
+                        tile = self.tiles[plane][row + x]
+
+                        if tile.rect.colliderect(rect):
+                            found.append(tile)
+
+        return found
+
+    def query_shapes(self, rect, mask):
+        '''Returns every Shape of solid tiles in mask that overlaps the given rect.'''
+        x_start = max(rect.left // TILE_SIZE, -1)
+        x_end = min((rect.right - 1) // TILE_SIZE, self.width)
+        y_start = max(rect.top // TILE_SIZE, 0)
+        y_end = min((rect.bottom - 1) // TILE_SIZE, self.height - 1)
+
+        found = []
+
+        for y in range(y_start, y_end + 1):
+            row = self.index(0, y)
+
+            for x in range(x_start, x_end + 1):
+                bits = self.bits[row + x] & mask & SOLID
+
+                if bits == 0:
+                    continue
+
+                for plane, plane_bits in enumerate(PLANE_BITS):
+                    if bits & plane_bits:
+                        shape = self.shapes[plane][row + x]
+
+                        if shape not in found and shape.rect.colliderect(rect):
+                            found.append(shape)
+
+        return found
+
+    def sweep(self, rect, dx, dy, mask):
+        '''
+        Sweeps rect along a single axis by either dx or dy, returning how far it can go
+        before hitting a solid tile in mask along with every tile it hits at that point. As
+        the entire path is checked at once, a rect can never skip over a tile no matter how
+        fast it goes.
+        '''
+        path = rect.union(rect.move(dx, dy))
+
+        travel = abs(dx + dy)
+        hit = []
+
+        for shape in self.query_shapes(path, mask):
+            # Find the distance until we touch this shape, which is our time of impact
+            # along the axis. This can be negative if we were already inside the shape,
+            # which pushes us back out the way we came in.
+            distance = contact(rect, dx, dy, shape.rect)
+
+            if distance < travel or not hit:
+                travel = distance
+                hit = [shape]
+            elif distance == travel:
+                hit.append(shape)
+
+        # Only the tiles of a shape right where we touched it are actually hit.
+        tiles = []
+
+        for shape in hit:
+            for tile in self.query(path.clip(shape.rect), mask & PLANE_BITS[shape.plane] & SOLID):
+                if contact(rect, dx, dy, tile.rect) == travel:
+                    tiles.append(tile)
+
+        return travel, tiles
+
+    def flash_around(self, center, mask):
+        '''
+        Flashes every tile in mask near center, with closer tiles flashing brighter. Returns
+        every tile that was flashed.
+        '''
+        cx, cy = center
+        flashed = []
+
+        x_start = max((cx - FLASH_RADIUS) // TILE_SIZE, -1)
+        x_end = min((cx + FLASH_RADIUS) // TILE_SIZE, self.width)
+        y_start = max((cy - FLASH_RADIUS) // TILE_SIZE, 0)
+        y_end = min((cy + FLASH_RADIUS) // TILE_SIZE, self.height - 1)
+
+        for y in range(y_start, y_end + 1):
+            row = self.index(0, y)
+
+            for x in range(x_start, x_end + 1):
+                bits = self.bits[row + x] & mask
+
+                if bits == 0:
+                    continue
+
+                for plane, plane_bits in enumerate(PLANE_BITS):
+                    if bits & plane_bits:
+                        tx, ty = self.tiles[plane][row + x].rect.center
+                        d2 = ((tx - cx) ** 2) + ((ty - cy) ** 2)
+
+                        # Anything outside of the radius is too far away to flash.
+                        if d2 < len(FLASH_FALLOFF):
+                            self.flash[plane][row + x] = FLASH_FALLOFF[d2]
+                            flashed.append(self.tiles[plane][row + x])
+
+        return flashed
+
+    def stream(self, view):
+        '''
+        Spawns the sprites of every chunk within a chunk of view, and removes the sprites
+        of every chunk further out than that.
+        '''
+        span = CHUNK_SIZE * TILE_SIZE
+        area = view.inflate(span * 2, span * 2)
+
+        # Chunks are counted from tile 0, so the padding column on the left is in chunk -1.
+        x_start = max(area.left // TILE_SIZE, -1) // CHUNK_SIZE
+        x_end = min((area.right - 1) // TILE_SIZE, self.width) // CHUNK_SIZE
+        y_start = max(area.top // TILE_SIZE, 0) // CHUNK_SIZE
+        y_end = min((area.bottom - 1) // TILE_SIZE, self.height - 1) // CHUNK_SIZE
+
+        near = {(cx, cy) for cx in range(x_start, x_end + 1) for cy in range(y_start, y_end + 1)}
+
+        for chunk in [chunk for chunk in self.chunks if chunk not in near]:
+            for sprite in self.chunks.pop(chunk):
+                self.remove(sprite)
+                sprite.kill()
+
+        for chunk in near:
+            if chunk not in self.chunks:
+                self.chunks[chunk] = self.spawn_chunk(*chunk)
+
+    def spawn_chunk(self, cx, cy):
+        '''Spawns a sprite for every tile in a chunk, returning all of them.'''
+        sprites = []
+
+        for y in range(cy * CHUNK_SIZE, min((cy + 1) * CHUNK_SIZE, self.height)):
+            for x in range(max(cx * CHUNK_SIZE, -1), min((cx + 1) * CHUNK_SIZE, self.width + 1)):
+                idx = self.index(x, y)
+
+                for plane, data in enumerate(self.data):
+                    if data[idx] != 0:
+                        sprites.append(self.spawn(plane, x, y, data[idx]))
+
+        for plane in range(len(PLANES)):
+            self.merge(cx, cy, plane)
+
+        return sprites
+
+    def merge(self, cx, cy, plane):
+        '''
+        Greedily merges the solid tiles of a plane in a chunk into as few Shapes as possible,
+        growing each one as far right as it can go and then as far down as it can go.
+        '''
+        solid = SOLID & PLANE_BITS[plane]
+        unstable = UNSTABLE & PLANE_BITS[plane]
+        tiles = self.tiles[plane]
+        shapes = self.shapes[plane]
+
+        x_start = max(cx * CHUNK_SIZE, -1)
+        x_end = min((cx + 1) * CHUNK_SIZE, self.width + 1)
+        y_start = cy * CHUNK_SIZE
+        y_end = min((cy + 1) * CHUNK_SIZE, self.height)
+
+        for y in range(y_start, y_end):
+            row = self.index(0, y)
+            shapes[row + x_start:row + x_end] = [None] * (x_end - x_start)
+
+        def fits(first, idx):
+            # Only merge unmerged tiles that are the same kind and take up the same part of their cell.
+            return (
+                self.bits[idx] & solid and shapes[idx] is None
+                and self.bits[idx] & unstable == self.bits[first.cell] & unstable
+                and tiles[idx].rect.height == first.rect.height
+                and tiles[idx].rect.top % TILE_SIZE == first.rect.top % TILE_SIZE
+            )
+
+        for y in range(y_start, y_end):
+            row = self.index(0, y)
+
+            for x in range(x_start, x_end):
+                first = tiles[row + x]
+
+                if not self.bits[row + x] & solid or shapes[row + x] is not None:
+                    continue
+
+                width = 1
+
+                while x + width < x_end and fits(first, row + x + width):
+                    width += 1
+
+                # Tiles that don't fill their entire cell would leave gaps between rows.
+                height = 1
+
+                while (first.rect.height == TILE_SIZE and y + height < y_end
+                        and all(fits(first, self.index(x + i, y + height)) for i in range(width))):
+                    height += 1
+
+                shape = Shape(plane, pygame.Rect(
+                    first.rect.left, first.rect.top, width * TILE_SIZE, first.rect.height + (height - 1) * TILE_SIZE
+                ))
+
+                for i in range(height):
+                    idx = self.index(x, y + i)
+                    shapes[idx:idx + width] = [shape] * width
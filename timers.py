@@ -0,0 +1,50 @@
+class Timer():
+    '''A callback that is due on a certain tick, which can be cancelled before it happens.'''
+    def __init__(self, due, callback):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        '''Stops this timer from ever happening.'''
+        self.cancelled = True
+
+class TimerWheel():
+    '''
+    Schedules callbacks some amount of ticks in the future. Timers are kept in a ring of
+    slots by the tick they are due on, so moving on to the next tick only ever looks at the
+    timers in a single slot, no matter how many are waiting.
+    '''
+    SLOTS = 256
+
+    def __init__(self):
+        self.tick = 0
+        self.slots = [[] for i in range(TimerWheel.SLOTS)]
+
+    def schedule(self, delay, callback):
+        '''
+        Calls callback delay ticks from now, returning the Timer for it. Anything that isn't
+        delayed at all is called right away instead.
+        '''
+        if delay <= 0:
+            callback()
+            return None
+
+        timer = Timer(self.tick + delay, callback)
+        self.slots[timer.due % TimerWheel.SLOTS].append(timer)
+
+        return timer
+
+    def advance(self):
+        '''Moves on to the next tick, calling every timer due on it.'''
+        self.tick += 1
+
+        slot = self.slots[self.tick % TimerWheel.SLOTS]
+
+        # Timers more than a full turn of the wheel away share this slot, so leave those be.
+        due = [timer for timer in slot if timer.due == self.tick]
+        slot[:] = [timer for timer in slot if timer.due != self.tick]
+
+        for timer in due:
+            if not timer.cancelled:
+                timer.callback()
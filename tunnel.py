@@ -0,0 +1,141 @@
+# This script fires the player headlessly at every kind of tile, falling onto it and running
+# into it from the side, at terminal velocity and faster. Every shot has to end the way it
+# would at walking speed: landing on or stopping at solid tiles, dying to hazards, bouncing
+# off springs and leaving through exits. Anything else means the player tunnelled through.
+# Run it from the project directory with python3 tunnel.py, or python3 tunnel.py 10 80 to
+# pick the speeds to fire at, in pixels a tick.
+
+import os
+
+# Nothing is shown, so don't bother opening a window or an audio device.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import sys
+import pygame
+import sprites
+import display
+import res
+import world
+
+# Where the player starts and where the tile is, in tiles.
+DROP_FROM = (10, 0)
+SHOOT_FROM = (2, 8)
+DROP_ONTO = (10, 12)
+SHOOT_AT = (20, 8)
+
+# A wall of blocks a tile behind the tile, which stops a player that went through it. That
+# way going through a hazard never looks like dying to it by falling out of the level.
+DROP_WALL = [(x, DROP_ONTO[1] + 2) for x in range(DROP_ONTO[0] - 1, DROP_ONTO[0] + 2)]
+SHOOT_WALL = [(SHOOT_AT[0] + 2, y) for y in range(SHOOT_AT[1] - 1, SHOOT_AT[1] + 2)]
+
+# How many ticks a shot has to end in, on top of however many it takes to cross the screen.
+TICKS = 60
+
+# Every kind of tile, and how a shot at it has to end.
+TILES = {
+    "block":      (lambda game, pos: sprites.Block(game, pos, display.BLACK), "stopped"),
+    "unstable":   (lambda game, pos: sprites.Unstable(game, pos, display.BLACK), "stopped"),
+    "spike up":   (lambda game, pos: sprites.Spike(game, pos, display.BLACK, sprites.Spike.DIR_UP), "died"),
+    "spike left": (lambda game, pos: sprites.Spike(game, pos, display.BLACK, sprites.Spike.DIR_LEFT), "died"),
+    "spike down": (lambda game, pos: sprites.Spike(game, pos, display.BLACK, sprites.Spike.DIR_DOWN), "died"),
+    "spike right":(lambda game, pos: sprites.Spike(game, pos, display.BLACK, sprites.Spike.DIR_RIGHT), "died"),
+    "spring":     (lambda game, pos: sprites.Spring(game, pos, display.BLACK), "bounced"),
+    "exit":       (lambda game, pos: sprites.Exit(game, pos, display.BLACK), "left"),
+    "kill":       (lambda game, pos: sprites.Kill(game, pos), "died"),
+    "rgb exit":   (lambda game, pos: sprites.RgbExit(game, pos), "left"),
+}
+
+def fire(player_type, make, speed, sideways):
+    '''
+    Fires a player of player_type at a tile made by make, speed pixels a tick, falling onto
+    it or running into it from the left. Returns how the shot ended.
+    '''
+    game = world.World()
+    game.set_bg(display.WHITE)
+    game.init_bg = display.WHITE
+
+    # Let the player fall as fast as it's fired.
+    fast = type("FastPlayer", (player_type,), {})
+    player = fast(game, SHOOT_FROM if sideways else DROP_FROM, sprites.Player.RIGHT)
+    fast.TERMINAL_VEL = max(player_type.TERMINAL_VEL, player.subpixel(speed))
+
+    game.player = player
+    make(game, SHOOT_AT if sideways else DROP_ONTO)
+
+    for pos in SHOOT_WALL if sideways else DROP_WALL:
+        sprites.Block(game, pos, display.BLACK)
+
+    player.vel.y = 0 if sideways else player.subpixel(speed)
+    stopped = False
+
+    for tick in range(TICKS + int(display.SWIDTH / speed)):
+        if sideways:
+            # Keep it level and at full speed, however it would slow down otherwise.
+            player.vel.update(player.subpixel(speed), 0)
+
+        deaths, level = game.deaths, game.level
+        player.update()
+
+        if game.player is not player or game.level != level:
+            return "left"
+
+        if game.deaths != deaths:
+            return "died"
+
+        if player.vel.y < 0:
+            return "bounced"
+
+        # Anything passed through on the way is only touched at the start of the next tick,
+        # so run one more after stopping.
+        if stopped:
+            break
+
+        if sideways:
+            player.pos.y = player.subpixel(SHOOT_FROM[1] * sprites.Player.HEIGHT)
+            player.rect.y = SHOOT_FROM[1] * sprites.Player.HEIGHT
+
+            stopped = player.vel.x == 0
+        else:
+            stopped = player.on_ground
+
+    # Stopping only counts right at the tile, rather than at the wall behind it.
+    if (player.rect.right, player.rect.y) == (SHOOT_AT[0] * sprites.Player.WIDTH, SHOOT_FROM[1] * sprites.Player.HEIGHT):
+        return "stopped"
+
+    if (player.rect.x, player.rect.bottom) == (DROP_FROM[0] * sprites.Player.WIDTH, DROP_ONTO[1] * sprites.Player.HEIGHT):
+        return "stopped"
+
+    return f"went through to {player.rect.topleft}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks that the player never goes through a tile, however fast it goes.")
+    parser.add_argument("speeds", type=float, nargs="*", help=f"how fast to fire, in pixels a tick, {sprites.Player.TERMINAL_VEL} and four times that by default")
+    args = parser.parse_args()
+
+    pygame.init()
+    display.create()
+
+    res.audio_enabled = False
+
+    failures = 0
+
+    for player_type in (sprites.Player, sprites.FixedPlayer):
+        for speed in args.speeds or (sprites.Player.TERMINAL_VEL, sprites.Player.TERMINAL_VEL * 4):
+            for name, (make, expected) in TILES.items():
+                for sideways in (False, True):
+                    ended = fire(player_type, make, speed, sideways)
+
+                    if ended != expected:
+                        failures += 1
+                        print(
+                            f"{player_type.__name__} {'running into' if sideways else 'falling onto'} {name} "
+                            f"at {speed} px/tick {ended}, should have {expected}"
+                        )
+
+    if failures:
+        print(f"{failures} shots didn't end the way they should")
+        sys.exit(1)
+
+    print("every shot ended the way it should")
@@ -0,0 +1,45 @@
+# This script plays recordings made with python3 monoman.py --record headlessly, and checks
+# the state of every tick against the checksums they were recorded with. Any recording that
+# plays out differently, whether from a change to the game or from running somewhere else, is
+# reported with the first tick it went wrong on. Run it with python3 verify.py run.mrep ...
+
+import os
+
+# Nothing is shown, so don't bother opening a window or an audio device.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import pygame
+import replay
+import display
+import world
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks that recordings still play out the way they were recorded.")
+    parser.add_argument("recordings", nargs="+", help="recordings made with monoman.py --record")
+    args = parser.parse_args()
+
+    pygame.init()
+    display.create()
+
+    desynced = 0
+
+    for path in args.recordings:
+        recording = replay.Recording.load(path)
+        physics = "fixed-point" if recording.hints & replay.Recording.HINT_FIXED else "float"
+
+        if not recording.checksums:
+            print(f"{path}: has no checksums to check against")
+            continue
+
+        tick = recording.verify(world.World())
+
+        if tick is None:
+            print(f"{path}: all {len(recording.checksums)} ticks match ({physics} physics)")
+        else:
+            desynced += 1
+            print(f"{path}: desynced on tick {tick}, {tick * recording.dt:.2f}s in ({physics} physics)")
+
+    if desynced:
+        raise SystemExit(1)
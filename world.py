@@ -0,0 +1,450 @@
+import pygame
+import sprites
+import display
+import decor
+import lvl
+import random
+import tilemap
+import timers
+import struct
+import zlib
+
+class Layers(pygame.sprite.LayeredUpdates):
+    '''
+    A LayeredUpdates that remembers the order sprites were put into their layers in, so that
+    any handful of its sprites can be put back into the exact order the group has them in.
+    '''
+    def __init__(self, *sprites):
+        self.orders = {}
+        self.counter = 0
+
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+
+        # Sprites always go at the end of their layer.
+        self.counter += 1
+        self.orders[sprite] = self.counter
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+
+        self.orders.pop(sprite, None)
+
+    def change_layer(self, sprite, new_layer):
+        super().change_layer(sprite, new_layer)
+
+        self.counter += 1
+        self.orders[sprite] = self.counter
+
+    def order(self, sprite):
+        '''Returns a key that sorts sprites of this group in the order they would update in.'''
+        return (self.get_layer_of_sprite(sprite), self.orders[sprite])
+
+    def reorder(self):
+        '''Puts every sprite back in the order of its key, after those were changed by hand.'''
+        self._spritelist.sort(key=self.order)
+
+class Frame():
+    '''
+    Everything needed to draw a single tick of a world, taken at the end of it. Positions are
+    copied and so is every image that its sprite draws into itself, so a frame never changes
+    once taken, and can be drawn while the world goes on with the next tick.
+    '''
+    def __init__(self, bg_rgb, bg, stage, fg, shake_offset, fade_alpha=0):
+        self.bg_rgb = bg_rgb
+        self.bg = bg
+        self.stage = stage
+        self.fg = fg
+        self.shake_offset = shake_offset
+        self.fade_alpha = fade_alpha
+
+    def draw(self, screen, stage_surf):
+        '''
+        Draws this frame to the screen, using stage_surf to shake the stage on. Returns how
+        many draw calls that took, and how many sprites they drew.
+        '''
+        # First step is to draw the stage sprites, handling any shaking effect.
+        stage_surf.fill(display.TRANSPARENT_RGB)
+        stage_surf.blits(self.stage, doreturn=False)
+        draw_calls = 1
+
+        if self.shake_offset is not None:
+            # Shaking blits the stage away and back again.
+            display.shake_surface(stage_surf, self.shake_offset)
+            draw_calls += 2
+
+        # Then fill the screen with the background color
+        screen.fill(self.bg_rgb)
+
+        # Then draw the background, stage, and foreground.
+        screen.blits(self.bg, doreturn=False)
+        screen.blit(stage_surf, (0, 0))
+        screen.blits(self.fg, doreturn=False)
+
+        # Apply the alpha to the surface, if we even have any.
+        display.fade_surface(screen, self.fade_alpha)
+
+        # The background, stage, foreground and fade.
+        draw_calls += 4
+
+        return draw_calls, len(self.stage) + len(self.bg) + 1 + len(self.fg)
+
+class World():
+    '''
+    Holds every sprite group and piece of state for a single game instance.
+    Nothing in monoman touches module-level state, so any amount of worlds can
+    live in the same process without interfering with each other.
+    '''
+    # The groups whose sprites are saved in a snapshot, and the modules their classes are in.
+    SNAPSHOT_GROUPS = ("g_bg", "g_stage", "g_fg")
+    SNAPSHOT_MODULES = {"sprites": sprites, "decor": decor}
+
+    # What goes into the checksum every tick: the tick, level, background color, deaths, how
+    # many sprites that aren't cosmetic are awake, and the rect, position and velocity of the player.
+    CHECKSUM = struct.Struct(">IBBIIiidddd")
+
+    def __init__(self, seed=None):
+        # --- GROUPS ---
+        self.g_bg       = Layers() # Drawn in the background, no shake
+        self.g_stage    = Layers() # Drawn with the shake effect
+        self.g_fg       = Layers() # Drawn above both layers, no shake
+
+        # All entities
+        self.g_entity   = pygame.sprite.Group()
+
+        # All decoration sprites
+        self.g_decor    = pygame.sprite.Group()
+
+        # All sprites that need to be regenerated, requires a method named "regen" that
+        # regenerates the sprite when called.
+        self.g_regen    = pygame.sprite.Group()
+
+        # All sprites that draw themselves differently depending on the background color,
+        # which are woken up whenever it changes.
+        self.g_recolor  = pygame.sprite.Group()
+
+        # All sprites that draw into their own image rather than swapping between shared ones,
+        # whose images have to be copied into a Frame.
+        self.g_redraw   = pygame.sprite.Group()
+
+        # All sprites that only show something and never change what happens in this world,
+        # like ghosts. Whether they're around is left out of the checksum.
+        self.g_cosmetic = pygame.sprite.Group()
+
+        # Only these sprites are updated each tick. Everything else is asleep until a timer
+        # or some event wakes it up, which is most obstacles most of the time.
+        self.awake = set()
+
+        # Occupancy bitmaps of every obstacle in the current level. This is how collidable
+        # and interactable sprites are found.
+        self.tilemap = tilemap.TileMap(
+            display.SWIDTH // tilemap.TILE_SIZE, display.SHEIGHT // tilemap.TILE_SIZE
+        )
+
+        # The part of the level that is currently on screen, which follows the player around
+        # levels that are larger than the screen.
+        self.camera = pygame.Rect(0, 0, display.SWIDTH, display.SHEIGHT)
+
+        # How many Surface.blits calls the last frame took, and how many sprites they drew.
+        self.draw_calls = 0
+        self.sprites_drawn = 0
+
+        # How many ticks this world has run for. Every animated obstacle picks its frame
+        # from this instead of keeping a counter of its own.
+        self.ticks = 0
+
+        # Everything waiting for a certain tick to come around, counted in world ticks.
+        self.timers = timers.TimerWheel()
+
+        # A running checksum of the state of this world after every tick so far. Two worlds
+        # that ever went their separate ways never have the same checksum again.
+        self.checksum = 0
+
+        # Whether the player's physics are done in whole numbers, see sprites.FixedPlayer.
+        self.fixed = False
+
+        # Where the player goes and dies in this world is counted here, see telemetry.Session.
+        self.telemetry = None
+
+        # The times and deaths of every run and level in this world are kept here, see stats.Stats.
+        self.stats = None
+
+        # --- DISPLAY STATE ---
+        self.bg_color = display.WHITE # Current BG color
+        self.shake = 0 # Current "shake" value [used in display.shake_offset]
+        self.shake_offset = None # Where the stage is shaken to this tick, if it is at all
+
+        # Every random effect in this world pulls from here instead of the global
+        # random module, so that worlds don't disturb each other's sequences.
+        self.rng = random.Random(seed)
+
+        # --- LEVEL STATE ---
+        self.level = 0 # Current level
+        self.level_start = 0 # The tick the current level was generated on
+        self.player = None # Current player if there is one
+        self.init_bg = display.BLACK # Initial background outlined by the level.
+
+        self.time = 0 # Total time the game has taken so far
+        self.deaths = 0 # Total amount of deaths
+
+        # State to handle the instruction text
+        self.has_moved = False
+        self.has_flipped = False
+
+    def bg_inv(self):
+        '''Returns the inverted variant of the background color.'''
+        return display.WHITE if self.bg_color == display.BLACK else display.BLACK
+
+    def bg_rgb(self):
+        '''Returns the current background color as an RGB value.'''
+        return [self.bg_color] * 3
+
+    def set_bg(self, color):
+        '''Changes the background color, waking up everything that has to be redrawn for it.'''
+        self.bg_color = color
+
+        for sprite in self.g_recolor:
+            self.wake(sprite)
+
+    def wake(self, sprite):
+        '''Has sprite be updated every tick from now on, until it is put to sleep.'''
+        self.awake.add(sprite)
+
+    def sleep(self, sprite):
+        '''Stops updating sprite, until something wakes it up again.'''
+        self.awake.discard(sprite)
+
+    def schedule(self, delay, callback):
+        '''Calls callback at the start of the tick delay ticks from now. See TimerWheel.schedule.'''
+        return self.timers.schedule(delay, callback)
+
+    def update(self):
+        '''Updates every awake sprite in every layer of this world.'''
+        self.ticks += 1
+        self.timers.advance()
+
+        self.awake = {sprite for sprite in self.awake if sprite.alive()}
+
+        # Sprites are updated in the same order their groups would update them in, and only
+        # the ones awake when a group's turn comes are updated, just like Group.update.
+        for group in (self.g_bg, self.g_stage, self.g_fg):
+            awake = [sprite for sprite in self.awake if group.has(sprite)]
+
+            for sprite in sorted(awake, key=group.order):
+                sprite.update()
+
+        self.follow()
+
+        if self.telemetry is not None:
+            self.telemetry.tick(self)
+
+        # Pick how to shake the stage here rather than while drawing, so that what happens
+        # in a world never depends on whether it was drawn.
+        if self.shake > 0:
+            self.shake_offset = display.shake_offset(self.shake, self.rng)
+            self.shake -= 1
+        else:
+            self.shake_offset = None
+
+        self.checksum = zlib.crc32(self.state_bytes(), self.checksum)
+
+    def state_bytes(self):
+        '''Packs the state that goes into the checksum, see World.CHECKSUM.'''
+        player = self.player
+        awake = len(self.awake) - sum(1 for sprite in self.g_cosmetic if sprite in self.awake)
+
+        if player is None:
+            return World.CHECKSUM.pack(
+                self.ticks, self.level, self.bg_color, self.deaths, awake, 0, 0, 0, 0, 0, 0
+            )
+
+        return World.CHECKSUM.pack(
+            self.ticks, self.level, self.bg_color, self.deaths, awake, player.rect.x, player.rect.y,
+            player.pos.x, player.pos.y, player.vel.x, player.vel.y
+        )
+
+    def follow(self):
+        '''Moves the camera to the player, and streams in the level around it.'''
+        if self.player is not None:
+            self.camera.center = self.player.rect.center
+            self.camera.clamp_ip(self.tilemap.rect)
+
+        self.tilemap.stream(self.camera)
+
+    def gather(self, group):
+        '''
+        Returns what to draw for every sprite in a group as (surface, position) pairs, which
+        are already in layer order.
+        '''
+        return [(sprite.image, sprite.rect) for sprite in group]
+
+    def submit(self, surf, commands):
+        '''Draws every (surface, position) pair in commands to surf with a single call.'''
+        surf.blits(commands, doreturn=False)
+
+        self.draw_calls += 1
+        self.sprites_drawn += len(commands)
+
+    def frame(self, fade_alpha=0):
+        '''Returns a Frame of how this world looks right now, faded out by fade_alpha.'''
+        return Frame(
+            self.bg_rgb(), self.capture(self.g_bg), self.capture(self.g_stage, self.camera),
+            self.capture(self.g_fg), self.shake_offset, fade_alpha
+        )
+
+    def capture(self, group, view=None):
+        '''
+        Like gather, except that positions are always copied, and so is any image that its
+        sprite draws into itself, so that nothing in the world can change them afterwards.
+        With a view, only sprites in it are kept, relative to it.
+        '''
+        redraw = self.g_redraw
+        x, y = (0, 0) if view is None else view.topleft
+
+        return [
+            (sprite.image.copy() if sprite in redraw else sprite.image, (sprite.rect.x - x, sprite.rect.y - y))
+            for sprite in group if view is None or sprite.rect.colliderect(view)
+        ]
+
+    def render(self, screen, stage_surf):
+        '''Draws a frame of the game to the screen, using stage_surf to shake the stage on.'''
+        self.draw_calls, self.sprites_drawn = self.frame().draw(screen, stage_surf)
+
+    def render_ui(self, screen):
+        '''Draws a frame of a menu to the screen, which is all on the stage and never moves.'''
+        self.draw_calls = 0
+        self.sprites_drawn = 0
+
+        screen.fill(display.BLACK_RGB)
+        self.submit(screen, self.gather(self.g_stage))
+
+    def snapshot(self):
+        '''
+        Returns the state of the level this world is in as plain data, which restore can put
+        any world back into. Every sprite that isn't part of the level has to have a snapshot
+        method and a restore class method to be saved, anything else is left out. Snapshots
+        are only taken between ticks.
+
+        The sprites that were saved are returned as well, in the same order as in the state.
+        '''
+        obstacles = []
+        tiles = set()
+
+        for chunk in self.tilemap.chunks.values():
+            for tile in chunk:
+                tiles.add(tile)
+                obstacles.append((
+                    tile.plane, tile.cell, self.g_stage.orders[tile], tile in self.awake, tile.snapshot()
+                ))
+
+        entries = []
+        saved = []
+
+        for name in World.SNAPSHOT_GROUPS:
+            group = getattr(self, name)
+
+            for sprite in group:
+                if sprite in tiles or not hasattr(sprite, "snapshot"):
+                    continue
+
+                entries.append((
+                    type(sprite).__module__, type(sprite).__name__, name, group.orders[sprite],
+                    sprite in self.awake, sprite.snapshot()
+                ))
+                saved.append(sprite)
+
+        state = {
+            "level": self.level, "level_start": self.level_start, "ticks": self.ticks, "time": self.time, "deaths": self.deaths,
+            "has_moved": self.has_moved, "has_flipped": self.has_flipped, "shake": self.shake,
+            "bg_color": self.bg_color, "init_bg": self.init_bg, "camera": tuple(self.camera),
+            "checksum": self.checksum, "fixed": self.fixed,
+            "rng": self.rng.getstate(),
+            "counters": [getattr(self, name).counter for name in World.SNAPSHOT_GROUPS],
+            "flash": [bytes(flash) for flash in self.tilemap.flash],
+            "obstacles": obstacles,
+            "sprites": entries,
+        }
+
+        return state, saved
+
+    def restore(self, state):
+        '''
+        Puts this world back into the state of a snapshot, returning the sprites that were saved
+        in the same order as the snapshot had them.
+        '''
+        self.destroy()
+
+        self.ticks = state["ticks"]
+        self.timers.tick = self.ticks
+
+        self.level = state["level"]
+        self.level_start = state["level_start"]
+        self.time = state["time"]
+        self.deaths = state["deaths"]
+        self.has_moved = state["has_moved"]
+        self.has_flipped = state["has_flipped"]
+        self.shake = state["shake"]
+        self.bg_color = state["bg_color"]
+        self.init_bg = state["init_bg"]
+        # Keyframes from version 3 recordings were taken before these were kept.
+        self.checksum = state.get("checksum", 0)
+        self.fixed = state.get("fixed", False)
+        self.player = None
+
+        lvl.load(self, self.level)
+
+        restored = []
+        awake = set()
+
+        for module, name, group, order, is_awake, sprite_state in state["sprites"]:
+            sprite = getattr(World.SNAPSHOT_MODULES[module], name).restore(self, sprite_state)
+            getattr(self, group).orders[sprite] = order
+
+            restored.append(sprite)
+
+            if is_awake:
+                awake.add(sprite)
+
+        # Streaming the level back in spawns every obstacle in its initial state, which is
+        # then brought up to date.
+        self.camera = pygame.Rect(state["camera"])
+        self.tilemap.stream(self.camera)
+
+        for plane, cell, order, is_awake, tile_state in state["obstacles"]:
+            tile = self.tilemap.tiles[plane][cell]
+            tile.restore_state(tile_state)
+            self.g_stage.orders[tile] = order
+
+            if is_awake:
+                awake.add(tile)
+
+        for flash, saved in zip(self.tilemap.flash, state["flash"]):
+            flash[:] = saved
+
+        for name, counter in zip(World.SNAPSHOT_GROUPS, state["counters"]):
+            getattr(self, name).counter = counter
+            getattr(self, name).reorder()
+
+        self.awake = awake
+        self.rng.setstate(state["rng"])
+
+        return restored
+
+    def destroy(self):
+        '''Completely wipes the world of any preexisting entities, starting its clock over.'''
+        for sprite in self.g_bg:
+            sprite.kill()
+
+        for sprite in self.g_stage:
+            sprite.kill()
+
+        for sprite in self.g_fg:
+            sprite.kill()
+
+        self.awake.clear()
+
+        self.ticks = 0
+        self.timers = timers.TimerWheel()
+        self.checksum = 0